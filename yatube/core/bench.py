@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import override_settings
+
+ALIAS = 'bench'
+
+
+class BenchRouter:
+    """Все чтения и записи идут во временную базу замера."""
+
+    def db_for_read(self, model, **hints):
+        return ALIAS
+
+    def db_for_write(self, model, **hints):
+        return ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == ALIAS
+
+
+@contextmanager
+def temporary_database():
+    """
+    Временная база SQLite и собственный кэш в памяти на время
+    замера. Код, который обращается к моделям без using и к кэшу
+    по умолчанию, работает с ними, не трогая рабочую базу и общий
+    кэш: замер не держит блокировку записи рабочей базы и не
+    оставляет в кэше значений для синтетических данных.
+    Возвращает соединение с временной базой.
+    """
+    directory = tempfile.mkdtemp()
+    connections.databases[ALIAS] = {
+        **connections.databases['default'],
+        'NAME': os.path.join(directory, 'bench.sqlite3'),
+    }
+    try:
+        with override_settings(
+            DATABASE_ROUTERS=['core.bench.BenchRouter'],
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'bench',
+            }},
+        ):
+            call_command('migrate', database=ALIAS, verbosity=0)
+            yield connections[ALIAS]
+    finally:
+        connections[ALIAS].close()
+        del connections[ALIAS]
+        connections.databases.pop(ALIAS, None)
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,238 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CULL_EVERY = 100
+MAX_VARIABLES = 500
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш в общем файле SQLite.
+
+    Один файл разделяют все процессы (воркеры gunicorn, тесты), поэтому
+    запись в одном воркере сразу видна остальным. incr и add выполняются
+    атомарно средствами SQLite, на этом держатся счётчики поколений
+    в posts.caching. Для нагруженных установок вместо этого бэкенда
+    следует использовать memcached или Redis.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса:
+        # после fork унаследованное соединение использовать нельзя.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _is_alive(expires):
+        return expires is None or expires > time.time()
+
+    @staticmethod
+    def _dumps(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._dumps(value), self.get_backend_timeout(timeout),
+             time.time())
+        )
+        self._after_write()
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or not self._is_alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._connection().execute(
+            'REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._dumps(value), self.get_backend_timeout(timeout))
+        )
+        self._after_write()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (key,)
+        )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        # BEGIN IMMEDIATE сразу берёт блокировку записи: чтение
+        # и запись нового значения не перемежаются с другими процессами.
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._is_alive(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), key)
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = {}
+        made_keys = list(keys)
+        for start in range(0, len(made_keys), MAX_VARIABLES):
+            chunk = made_keys[start:start + MAX_VARIABLES]
+            rows = self._connection().execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({})'
+                .format(', '.join('?' * len(chunk))),
+                chunk
+            )
+            for key, value, expires in rows:
+                if self._is_alive(expires):
+                    found[keys[key]] = pickle.loads(value)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        connection.execute('BEGIN')
+        try:
+            connection.executemany(
+                'REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                [
+                    (self._key(key, version), self._dumps(value), expires)
+                    for key, value in data.items()
+                ]
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._after_write()
+        return []
+
+    def delete_many(self, keys, version=None):
+        self._connection().executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys]
+        )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        connection = self._connection()
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),)
+        )
+        count = connection.execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()[0]
+        if count > self._max_entries and self._cull_frequency:
+            # Как и в FileBasedCache: удаляется 1/CULL_FREQUENCY записей,
+            # первыми те, что истекают раньше.
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+
+
+class LRUCache:
+    """
+    Небольшой кэш в памяти процесса с ограничением
+    по числу записей и времени жизни.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
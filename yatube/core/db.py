@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+from .routers import get_position, set_position
+
+# PRAGMA, которые можно задать в SQLITE_PRAGMAS. Имена подставляются
+# в SQL как есть, поэтому список закрыт.
+ALLOWED_PRAGMAS = {
+    'journal_mode', 'synchronous', 'mmap_size', 'cache_size',
+    'busy_timeout', 'temp_store', 'foreign_keys', 'wal_autocheckpoint',
+}
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Обработчик connection_created: применяет SQLITE_PRAGMAS к каждому
+    новому соединению с SQLite. При CONN_MAX_AGE > 0 соединения
+    переиспользуются, и PRAGMA выполняются один раз на соединение.
+    WAL позволяет читать ленты, пока другой запрос пишет пост,
+    а busy_timeout заставляет конкурирующих писателей ждать
+    вместо ошибки «database is locked».
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = settings.SQLITE_PRAGMAS
+    unknown = set(pragmas) - ALLOWED_PRAGMAS
+    if unknown:
+        raise ImproperlyConfigured(
+            f'Неизвестные PRAGMA в SQLITE_PRAGMAS: {", ".join(unknown)}'
+        )
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def copy_database(source, target):
+    """
+    Копирует базу SQLite source в target через backup API.
+    Заменяет репликацию, когда в роли реплики выступает
+    второй файл SQLite на той же машине. target получает позицию
+    записи, которой source достигла до начала копирования.
+    """
+    for alias in (source, target):
+        if connections[alias].vendor != 'sqlite':
+            raise ImproperlyConfigured(
+                f'Копировать можно только базы SQLite, {alias} - нет.'
+            )
+        connections[alias].ensure_connection()
+    position = get_position(source)
+    connections[source].connection.backup(connections[target].connection)
+    if position is not None:
+        set_position(target, position)
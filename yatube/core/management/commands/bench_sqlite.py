@@ -0,0 +1,125 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+
+from core.bench import ALIAS, temporary_database
+from posts.models import Post
+
+User = get_user_model()
+
+MODES = {
+    # Режим журнала сохраняется в файле базы, поэтому
+    # для сравнения его нужно выставить явно.
+    'default': {'journal_mode': 'delete'},
+    'tuned': None,
+}
+
+
+def read_feed(deadline):
+    reads = errors = 0
+    while time.time() < deadline:
+        try:
+            list(Post.objects.using(ALIAS).for_feed()[:10])
+            reads += 1
+        except OperationalError:
+            errors += 1
+    return reads, errors
+
+
+def write_posts(deadline, author_id):
+    writes = errors = 0
+    while time.time() < deadline:
+        try:
+            Post.objects.using(ALIAS).bulk_create(
+                [Post(text='Новый пост', author_id=author_id)]
+            )
+            writes += 1
+        except OperationalError:
+            errors += 1
+    return writes, errors
+
+
+def worker(target, args, results):
+    try:
+        results.put((target.__name__, target(*args)))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность чтения ленты при '
+        'параллельной записи постов: SQLite без настроек и с '
+        'SQLITE_PRAGMAS. Для каждого режима создаётся временная база.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--posts', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for mode, pragmas in MODES.items():
+            if pragmas is None:
+                pragmas = settings.SQLITE_PRAGMAS
+            # PRAGMA применяются при подключении, поэтому настройки
+            # подменяются до создания временной базы.
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                with temporary_database():
+                    self.run(mode, options)
+
+    def setup(self, posts):
+        # bulk_create не отправляет сигналов: замер сравнивает
+        # только чтение ленты и запись постов.
+        User.objects.using(ALIAS).bulk_create([User(username='bench')])
+        author = User.objects.using(ALIAS).get(username='bench')
+        Post.objects.using(ALIAS).bulk_create(
+            (Post(text=f'Пост {i}', author=author) for i in range(posts)),
+            batch_size=500
+        )
+        return author.pk
+
+    def run(self, mode, options):
+        author_id = self.setup(options['posts'])
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.time() + options['seconds']
+        processes = [
+            context.Process(
+                target=worker, args=(read_feed, (deadline,), results)
+            )
+            for _ in range(options['readers'])
+        ] + [
+            context.Process(
+                target=worker,
+                args=(write_posts, (deadline, author_id), results)
+            )
+            for _ in range(options['writers'])
+        ]
+        for process in processes:
+            process.start()
+        totals = {
+            read_feed.__name__: [0, 0],
+            write_posts.__name__: [0, 0],
+        }
+        for _ in processes:
+            name, (done, errors) = results.get()
+            totals[name][0] += done
+            totals[name][1] += errors
+        for process in processes:
+            process.join()
+        reads, read_errors = totals[read_feed.__name__]
+        writes, write_errors = totals[write_posts.__name__]
+        seconds = options['seconds']
+        self.stdout.write(
+            f'{mode:>8}: чтений {reads / seconds:.0f}/с '
+            f'(ошибок {read_errors}), записей {writes / seconds:.0f}/с '
+            f'(ошибок {write_errors})'
+        )
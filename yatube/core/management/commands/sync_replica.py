@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db import copy_database
+from core.routers import PRIMARY, REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файл реплики '
+        '(DATABASE_REPLICA) для локальной проверки чтения с реплики.'
+    )
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.databases:
+            raise CommandError(
+                'Реплика не настроена: задайте DATABASE_REPLICA.'
+            )
+        copy_database(PRIMARY, REPLICA)
+        self.stdout.write(self.style.SUCCESS(
+            f'{connections.databases[PRIMARY]["NAME"]} скопирована в '
+            f'{connections.databases[REPLICA]["NAME"]}.'
+        ))
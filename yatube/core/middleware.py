@@ -0,0 +1,32 @@
+from django.conf import settings
+
+from .routers import end_request, start_request
+
+STICKY_COOKIE = 'use_primary'
+
+
+class ReplicaMiddleware:
+    """
+    Чтение своих записей при работе с репликой: запрос, который
+    что-то записал, ставит cookie, и следующие запросы пользователя
+    в течение REPLICA_STICKY_SECONDS читают из основной базы,
+    пока реплика не догонит её.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request(STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = end_request(token)
+        if wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
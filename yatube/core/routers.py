@@ -0,0 +1,124 @@
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+POSITION_KEY = 'core:position:{}'
+
+_state = ContextVar('replica_state', default=None)
+
+
+def _get_state():
+    state = _state.get()
+    if state is None:
+        state = {'primary': False, 'wrote': False}
+        _state.set(state)
+    return state
+
+
+def start_request(sticky):
+    """
+    Начинает запрос: при sticky все чтения идут в основную базу.
+    Возвращает токен для end_request.
+    """
+    return _state.set({
+        'primary': sticky, 'wrote': False, 'replica_position': None
+    })
+
+
+def end_request(token):
+    """Завершает запрос, возвращает True, если в нём была запись."""
+    wrote = _state.get()['wrote']
+    _state.reset(token)
+    return wrote
+
+
+def reading_primary():
+    """Читает ли текущий запрос из основной базы."""
+    return REPLICA not in connections.databases or _get_state()['primary']
+
+
+def reading_own_writes():
+    """
+    Есть ли реплика и читает ли запрос мимо неё после недавней
+    записи. Общие кэши, собранные с отстающей реплики, такому
+    запросу показывать нельзя.
+    """
+    return REPLICA in connections.databases and _get_state()['primary']
+
+
+def advance_position():
+    """
+    Новая позиция записи основной базы: счётчик зафиксированных
+    изменений, которые отмечают кэши. None без реплики.
+    """
+    if REPLICA not in connections.databases:
+        return None
+    key = POSITION_KEY.format(PRIMARY)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Начальное значение берётся из часов, как у поколений:
+        # потерянный счётчик не начнётся заново ниже позиции реплики.
+        cache.add(key, int(time.time() * 1000), None)
+        return cache.incr(key)
+
+
+def get_position(alias):
+    """Позиция записи, до которой дошла база alias."""
+    return cache.get(POSITION_KEY.format(alias))
+
+
+def set_position(alias, position):
+    cache.set(POSITION_KEY.format(alias), position, None)
+
+
+def replica_has(position):
+    """
+    Дошла ли реплика, с которой читает запрос, до позиции position.
+    Запрос, читающий основную базу, видит всё.
+    """
+    if position is None or reading_primary():
+        return True
+    state = _get_state()
+    replica = state.get('replica_position')
+    if replica is None:
+        replica = get_position(REPLICA)
+        if 'replica_position' in state:
+            # Внутри запроса позиция реплики запоминается до его конца.
+            state['replica_position'] = replica
+    return replica is not None and replica >= position
+
+
+class ReplicaRouter:
+    """
+    Чтение моделей из REPLICA_READ_APPS идёт в реплику, запись
+    и всё остальное в основную базу. После записи чтения текущего
+    запроса, а благодаря ReplicaMiddleware и следующих запросов
+    пользователя в течение REPLICA_STICKY_SECONDS, тоже идут
+    в основную базу: автор сразу видит свой пост или комментарий.
+    Без базы 'replica' в DATABASES роутер ничего не меняет.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (reading_primary()
+                or model._meta.app_label not in settings.REPLICA_READ_APPS):
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _get_state()
+        state['wrote'] = state['primary'] = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной базы: объекты из обеих
+        # можно связывать друг с другом.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
@@ -1,5 +1,27 @@
+import os
+import runpy
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.cache import SQLiteCache
+from core.db import configure_sqlite, copy_database
+from core.middleware import STICKY_COOKIE
+from core.routers import (PRIMARY, REPLICA, ReplicaRouter, end_request,
+                          start_request)
+from posts.models import Post
 
 
 User = get_user_model()
@@ -38,3 +60,199 @@ class CorePagesTest(TestCase):
                     response,
                     template[self.user_list.index(us)]
                 )
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'), {}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Проверим основные операции кэша в файле SQLite."""
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+        self.cache.set('expired', 'value', 0)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 'fresh'))
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+
+class CacheSettingsTest(TestCase):
+    def load_caches(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(
+                os.path.join(settings.BASE_DIR, 'yatube', 'settings.py')
+            )['CACHES']['default']
+
+    def test_options_by_backend(self):
+        """
+        Проверим, что MAX_ENTRIES задаётся только бэкендам на базе
+        BaseCache, а внешним серверам нужен CACHE_LOCATION.
+        """
+        for backend in ('locmem', 'sqlite'):
+            with self.subTest(backend=backend):
+                caches = self.load_caches(CACHE_BACKEND=backend)
+                self.assertEqual(caches['OPTIONS'], {'MAX_ENTRIES': 10000})
+        for backend in ('memcached', 'redis'):
+            with self.subTest(backend=backend):
+                caches = self.load_caches(
+                    CACHE_BACKEND=backend, CACHE_LOCATION='127.0.0.1:11211'
+                )
+                self.assertNotIn('OPTIONS', caches)
+                self.assertEqual(caches['LOCATION'], '127.0.0.1:11211')
+                with self.assertRaises(ImproperlyConfigured):
+                    self.load_caches(CACHE_BACKEND=backend, CACHE_LOCATION='')
+
+
+class SQLitePragmasTest(TestCase):
+    def get_pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """
+        Проверим, что соединение получает PRAGMA из настроек,
+        а неизвестные PRAGMA не принимаются.
+        """
+        # 1 - synchronous=NORMAL, 2 - temp_store=MEMORY.
+        self.assertEqual(self.get_pragma('synchronous'), 1)
+        self.assertEqual(self.get_pragma('temp_store'), 2)
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -1000}):
+            configure_sqlite(sender=None, connection=connection)
+            self.assertEqual(self.get_pragma('cache_size'), -1000)
+        with override_settings(SQLITE_PRAGMAS={'user_version': 1}):
+            with self.assertRaises(ImproperlyConfigured):
+                configure_sqlite(sender=None, connection=connection)
+
+    def test_bench_command(self):
+        """Проверим, что сравнение режимов выполняется."""
+        out = StringIO()
+        call_command(
+            'bench_sqlite', seconds=0.2, readers=1, writers=1, posts=10,
+            stdout=out
+        )
+        self.assertIn('default', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+
+
+class ReplicaRouterTest(TransactionTestCase):
+    databases = {PRIMARY, REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика - отдельный файл SQLite, который обновляется только
+        # копированием основной базы, как отстающая реплика.
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            **connections.databases[PRIMARY],
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        copy_database(PRIMARY, REPLICA)
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_routing(self):
+        """
+        Проверим, что чтение постов идёт в реплику, чтение прочих
+        приложений и любая запись - в основную базу, а после записи
+        и чтение постов переходит в основную базу.
+        """
+        router = ReplicaRouter()
+        token = start_request(sticky=False)
+        self.assertEqual(router.db_for_read(Post), REPLICA)
+        self.assertEqual(router.db_for_read(User), REPLICA)
+        self.assertEqual(router.db_for_read(Session), PRIMARY)
+        self.assertEqual(router.db_for_write(Post), PRIMARY)
+        self.assertEqual(router.db_for_read(Post), PRIMARY)
+        self.assertTrue(end_request(token))
+        token = start_request(sticky=True)
+        self.assertEqual(router.db_for_read(Post), PRIMARY)
+        self.assertFalse(end_request(token))
+        self.assertFalse(router.allow_migrate(REPLICA, 'posts'))
+        self.assertTrue(router.allow_migrate(PRIMARY, 'posts'))
+
+    def test_author_reads_own_writes(self):
+        """
+        Проверим, что автор сразу видит свой пост, а гость видит
+        его только после того, как реплика догонит основную базу.
+        """
+        response = self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'}
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        post = Post.objects.using(PRIMARY).get(text='Свежий пост')
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.assertEqual(self.author_client.get(url).status_code, 200)
+        self.assertEqual(self.guest_client.get(url).status_code, 404)
+        response = self.author_client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        self.assertContains(response, 'Свежий пост')
+        copy_database(PRIMARY, REPLICA)
+        self.assertEqual(self.guest_client.get(url).status_code, 200)
+        response = self.guest_client.get(url)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_lagging_replica_not_cached(self):
+        """
+        Проверим, что страницы, собранные гостем с реплики, до которой
+        ещё не дошла запись, не попадают в общий кэш и не получают
+        ETag: когда реплика догонит основную базу, гость увидит пост
+        без сброса кэша. Запись в другие области кэш ленты
+        не выключает.
+        """
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'}
+        )
+        urls = (reverse('posts:index'), reverse('posts:index_rss'))
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotContains(response, 'Свежий пост')
+                self.assertFalse(response.has_header('ETag'))
+        copy_database(PRIMARY, REPLICA)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Свежий пост')
+                self.assertTrue(response.has_header('ETag'))
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        reader.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        ))
+        self.assertTrue(self.guest_client.get(urls[0]).has_header('ETag'))
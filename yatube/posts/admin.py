@@ -1,21 +1,64 @@
 from django.contrib import admin
 
+from .caching import get_group_choices
 from .models import Group, Post, Comment, Follow
+from .paginators import EstimatedCountPaginator
+from .search import matching
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
+    # Без фильтров число постов оценивается, а полное число
+    # рядом с отфильтрованным не считается вовсе.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        if not search_term:
+            return queryset, False
+        return matching(queryset, search_term), False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Один список на все строки списка вместо запроса
+            # к таблице групп в каждой из них.
+            field.choices = [('', field.empty_label)] + get_group_choices()
+        return field
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'post', 'author', 'created')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author', 'parent')
+    search_fields = ('=author__username', 'text')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
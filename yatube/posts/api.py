@@ -0,0 +1,229 @@
+from functools import partial, wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+
+from .models import TIMELINE_KEYS, Comment, Post
+from .paginators import (COMMENT_KEYS, COMMENTS_PER_PAGE, POSTS_PER_PAGE,
+                         CursorPaginator)
+from .timelines import TIMELINE, TimelinePaginator, merge_feed
+
+# Поле ответа -> столбец values(). Поля через связи (author, group)
+# добавляют JOIN, только если их запросили.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+POST_DEFAULT_FIELDS = ('id', 'text', 'pub_date', 'author', 'group', 'image')
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'parent': 'parent_id',
+    'depth': 'depth',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+COMMENT_DEFAULT_FIELDS = ('id', 'author', 'text', 'created')
+
+
+def not_found():
+    return JsonResponse({'detail': 'Не найдено.'}, status=404)
+
+
+def login_required_json(view):
+    """Как login_required, но гостю отвечает 401 вместо перехода."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Нужна авторизация.'}, status=401
+            )
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def content_condition(request, response):
+    """
+    ETag по содержимому для персональных ответов, которые нельзя
+    проверить по отметкам областей: экономит трафик, а не запросы.
+    """
+    set_response_etag(response)
+    return get_conditional_response(
+        request, etag=response['ETag'], response=response
+    )
+
+
+def parse_fields(request, available, default):
+    """
+    Поля ответа из ?fields=a,b в порядке из запроса.
+    ValueError с перечнем неизвестных полей.
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(default)
+    fields = list(dict.fromkeys(
+        field.strip() for field in value.split(',') if field.strip()
+    ))
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        raise ValueError(', '.join(unknown))
+    return fields
+
+
+def fields_error(error, available):
+    return JsonResponse({'errors': {'fields': [
+        f'Неизвестные поля: {error}. Доступны: {", ".join(available)}.'
+    ]}}, status=400)
+
+
+def columns(fields, available, keys=()):
+    """Столбцы values() для полей и ключей пагинации."""
+    return list(dict.fromkeys(
+        [available[field] for field in fields] + list(keys)
+    ))
+
+
+def serialize(row, fields, available):
+    """Словарь ответа из строки values() без создания модели."""
+    data = {field: row[available[field]] for field in fields}
+    if 'image' in data:
+        data['image'] = (
+            f'{settings.MEDIA_URL}{data["image"]}' if data['image'] else None
+        )
+    return data
+
+
+class RowsPaginator(CursorPaginator):
+    """
+    Курсорный пагинатор по словарям values(): позиция курсора
+    читается из столбцов keys, а не из атрибутов модели.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 ascending=False):
+        super().__init__(object_list, per_page, keys)
+        self.ascending = ascending
+
+    def cursor_key(self, row):
+        return row[self.keys[0]].isoformat()
+
+    def cursor_pk(self, row):
+        return row[self.keys[1]]
+
+
+class MergedRowsPaginator(RowsPaginator):
+    """
+    Лента подписок, собираемая слиянием при чтении (см. merge_feed):
+    строки страницы читаются из object_list по id.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 user=None):
+        super().__init__(object_list, per_page, keys)
+        self.user = user
+
+    def fetch(self, direction, pub_date, pk, limit):
+        ids = merge_feed(self.user, direction, pub_date, pk, limit)
+        rows = {row['id']: row for row in self.object_list.filter(
+            pk__in=ids
+        )}
+        return [rows[post_id] for post_id in ids if post_id in rows]
+
+
+class TimelineRowsPaginator(TimelinePaginator, RowsPaginator):
+    """
+    Лента подписок из материализованной ленты (см. TimelinePaginator):
+    строки ленты читаются с теми же столбцами, что и строки JOIN.
+    """
+
+    def timeline_paginator(self):
+        return RowsPaginator(
+            self.timeline.values(*self.object_list.query.values_select),
+            self.per_page, TIMELINE_KEYS
+        )
+
+
+def page_response(paginator, request, fields, available):
+    """JSON страницы: результаты и курсоры соседних страниц."""
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [
+            serialize(row, fields, available) for row in page.object_list
+        ],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def posts_response(request, posts, keys=('pub_date', 'id'),
+                   paginator_class=RowsPaginator):
+    """
+    Страница постов queryset posts одним запросом values()
+    с JOIN только для запрошенных связей.
+    """
+    try:
+        fields = parse_fields(request, POST_FIELDS, POST_DEFAULT_FIELDS)
+    except ValueError as error:
+        return fields_error(error, POST_FIELDS)
+    rows = posts.values(*columns(fields, POST_FIELDS, keys))
+    return page_response(
+        paginator_class(rows, POSTS_PER_PAGE, keys),
+        request, fields, POST_FIELDS
+    )
+
+
+def follow_response(request, user):
+    """Страница ленты подписок по стратегии POSTS_FOLLOW_FEED."""
+    if settings.POSTS_FOLLOW_FEED == TIMELINE:
+        return posts_response(
+            request, Post.objects.by_authors(user.follower.values('author')),
+            paginator_class=partial(
+                TimelineRowsPaginator, user=user,
+                timeline=Post.objects.timeline(user)
+            )
+        )
+    return posts_response(
+        request, Post.objects.all(),
+        paginator_class=partial(MergedRowsPaginator, user=user)
+    )
+
+
+def post_response(request, post_id):
+    """Один пост как строка values() или 404."""
+    try:
+        fields = parse_fields(request, POST_FIELDS, POST_DEFAULT_FIELDS)
+    except ValueError as error:
+        return fields_error(error, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *columns(fields, POST_FIELDS)
+    ).first()
+    if row is None:
+        return not_found()
+    return JsonResponse(serialize(row, fields, POST_FIELDS))
+
+
+def comments_response(request, post_id):
+    """Комментарии поста от старых к новым страницами по курсору."""
+    try:
+        fields = parse_fields(
+            request, COMMENT_FIELDS, COMMENT_DEFAULT_FIELDS
+        )
+    except ValueError as error:
+        return fields_error(error, COMMENT_FIELDS)
+    if not Post.objects.filter(pk=post_id).exists():
+        return not_found()
+    rows = Comment.objects.filter(post_id=post_id).values(
+        *columns(fields, COMMENT_FIELDS, COMMENT_KEYS)
+    )
+    return page_response(
+        RowsPaginator(rows, COMMENTS_PER_PAGE, COMMENT_KEYS, ascending=True),
+        request, fields, COMMENT_FIELDS
+    )
@@ -0,0 +1,396 @@
+import hashlib
+import math
+import random
+import time
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from core.cache import LRUCache
+from core.routers import advance_position, reading_primary, replica_has
+
+from .models import Group, Post
+
+FEED_GENERATION_KEY = 'posts:feed_generation'
+FOLLOW_GENERATION_KEY = 'posts:follow_generation:{}'
+FEED_KEY = 'posts:feed:{}'
+CARD_KEY = 'posts:card:{}:{}:{}'
+LAST_MODIFIED_KEY = 'posts:last_modified:{}'
+POST_AUTHOR_KEY = 'posts:post_author:{}'
+GROUP_CHOICES_KEY = 'posts:group_choices'
+POSITION_KEY = 'posts:position:{}'
+
+BUILD_LOCK_TIMEOUT = 10
+BUILD_POLL_INTERVAL = 0.05
+XFETCH_BETA = 1.0
+
+# Первый уровень: кэш в памяти процесса перед общим кэшем.
+# Фрагменты лент в нём проверяются по поколению из общего кэша,
+# карточки неизменяемы, так как их ключ включает всё, что они выводят.
+local_cache = LRUCache(
+    settings.POSTS_LOCAL_CACHE_SIZE,
+    settings.POSTS_LOCAL_CACHE_TIMEOUT
+)
+stats = Counter()
+
+
+def get_cache_stats():
+    """Попадания и промахи по уровням кэша в этом процессе."""
+    return {
+        'local': {
+            'hits': stats['local_hits'],
+            'misses': stats['local_misses'],
+            'size': len(local_cache),
+        },
+        'shared': {
+            'hits': stats['shared_hits'],
+            'misses': stats['shared_misses'],
+        },
+    }
+
+
+def _count(tier, hits, misses):
+    stats[f'{tier}_hits'] += hits
+    stats[f'{tier}_misses'] += misses
+
+
+CARD_TEMPLATE = 'includes/article.html'
+
+
+def _get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        # Начальное значение берётся из часов: если ключ вытеснят,
+        # новое поколение всё равно окажется больше любого прежнего,
+        # и старые фрагменты не всплывут снова.
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generation(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return _get_generation(key)
+
+
+def get_feed_generation():
+    return _get_generation(FEED_GENERATION_KEY)
+
+
+def now_and_on_commit(func, *args, keys=()):
+    """
+    Выполняет func(*args) сейчас и func() ещё раз после фиксации
+    транзакции. Так сбрасываются и сдвигаются значения в кэше:
+    параллельный запрос, читающий старый снимок базы, мог успеть
+    сохранить старое состояние уже после первого вызова.
+    Для keys - ключей, которые меняет func, - после фиксации
+    запоминается позиция записи (см. replica_lacks).
+    Возвращает результат первого вызова.
+    """
+    result = func(*args)
+
+    def on_commit():
+        func()
+        position = advance_position()
+        if position is not None and keys:
+            cache.set_many(
+                {POSITION_KEY.format(key): position for key in keys},
+                settings.REPLICA_STICKY_SECONDS
+            )
+
+    transaction.on_commit(on_commit)
+    return result
+
+
+def replica_lacks(keys):
+    """
+    Ключи из keys, последнее изменение которых ещё не дошло
+    до реплики, с которой читает запрос. Значение, прочитанное
+    с такой реплики, нельзя сохранять под этими ключами или под
+    их поколениями: устаревшая копия закрепилась бы под новыми.
+    Позиция хранится REPLICA_STICKY_SECONDS - с запасом дольше
+    отставания реплики.
+    """
+    if reading_primary() or not keys:
+        return set()
+    names = {POSITION_KEY.format(key): key for key in keys}
+    return {
+        names[name] for name, position in cache.get_many(names).items()
+        if not replica_has(position)
+    }
+
+
+def bump_feed_generation():
+    """Вызывается при любом создании, изменении и удалении поста."""
+    return now_and_on_commit(
+        partial(_bump_generation, FEED_GENERATION_KEY),
+        keys=[FEED_GENERATION_KEY]
+    )
+
+
+def get_follow_generation(user_id):
+    return _get_generation(FOLLOW_GENERATION_KEY.format(user_id))
+
+
+def bump_follow_generation(user_id):
+    """Вызывается при подписке и отписке пользователя."""
+    key = FOLLOW_GENERATION_KEY.format(user_id)
+    return now_and_on_commit(partial(_bump_generation, key), keys=[key])
+
+
+def get_page_token(request):
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return f'c{cursor}'
+    return f'p{request.GET.get("page", "")}'
+
+
+def feed_cache_context(request, view_name, *scope):
+    """
+    Контекст для {% cached_feed %}: ключ фрагмента зависит от ленты,
+    её области (группа, автор, подписчик) и страницы, а поколение
+    определяет, свежий ли сохранённый фрагмент. feed_sources -
+    ключи этих поколений для get_or_build.
+    """
+    key = ':'.join([view_name, *map(str, scope), get_page_token(request)])
+    generation = [get_feed_generation()]
+    sources = [FEED_GENERATION_KEY]
+    if view_name == 'follow_index':
+        generation.append(get_follow_generation(request.user.pk))
+        sources.append(FOLLOW_GENERATION_KEY.format(request.user.pk))
+    return {
+        'feed_cache_key': FEED_KEY.format(
+            hashlib.md5(key.encode()).hexdigest()
+        ),
+        'feed_generation': tuple(generation),
+        'feed_sources': sources,
+    }
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _store(key, value, generation, delta, timeout):
+    entry = {
+        'value': value,
+        'generation': generation,
+        'expires': time.time() + timeout,
+        'delta': delta,
+    }
+    # Запись живёт в кэше дольше своего срока, чтобы её можно было
+    # отдавать как устаревшую, пока другой процесс строит новую.
+    cache.set(key, entry, timeout + settings.POSTS_CACHE_STALE_TIMEOUT)
+    local_cache.set(key, entry)
+
+
+def _get_entry(key, generation):
+    """Запись фрагмента: из памяти процесса, если она того же поколения."""
+    entry = local_cache.get(key)
+    if entry is not None and entry['generation'] == generation:
+        _count('local', 1, 0)
+        return entry
+    _count('local', 0, 1)
+    entry = cache.get(key)
+    if entry is None:
+        _count('shared', 0, 1)
+        return None
+    _count('shared', 1, 0)
+    if entry['generation'] == generation:
+        local_cache.set(key, entry)
+    return entry
+
+
+def _is_fresh(entry, generation):
+    """
+    Свежесть с вероятностным ранним пересчётом (XFetch): чем ближе
+    срок и чем дольше строится значение, тем вероятнее, что один
+    из запросов возьмётся за пересчёт заранее.
+    """
+    if entry['generation'] != generation:
+        return False
+    early = entry['delta'] * XFETCH_BETA * -math.log(
+        1.0 - random.random()
+    )
+    return time.time() + early < entry['expires']
+
+
+def get_or_build(key, build, timeout, generation=None, sources=()):
+    """
+    Значение из кэша или результат build() с защитой от лавины.
+    Строит значение только процесс, взявший блокировку key:lock;
+    остальные тем временем получают устаревшее значение, а если его
+    нет совсем, ждут, пока строитель положит результат в кэш.
+    sources - ключи поколений значения: пока их изменение не дошло
+    до реплики, значение не сохраняется (см. replica_lacks), а запрос
+    получает прежний вариант - реплика всё равно не новее его.
+    """
+    entry = _get_entry(key, generation)
+    if entry is not None and _is_fresh(entry, generation):
+        return entry['value']
+    if replica_lacks(sources):
+        return build() if entry is None else entry['value']
+    deadline = time.time() + BUILD_LOCK_TIMEOUT
+    while True:
+        if cache.add(_lock_key(key), 1, BUILD_LOCK_TIMEOUT):
+            try:
+                started = time.time()
+                value = build()
+                _store(key, value, generation, time.time() - started,
+                       timeout)
+            finally:
+                cache.delete(_lock_key(key))
+            return value
+        if entry is not None:
+            return entry['value']
+        if time.time() > deadline:
+            return build()
+        time.sleep(BUILD_POLL_INTERVAL)
+        entry = _get_entry(key, generation)
+        if entry is not None and entry['generation'] == generation:
+            return entry['value']
+
+
+def card_cache_key(post):
+    stamp = int(post.updated.timestamp() * 1000000)
+    # Карточка выводит и имя автора, и ссылку на группу: их правка
+    # тоже должна давать новую карточку.
+    related = ':'.join([
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    ])
+    return CARD_KEY.format(
+        post.pk, stamp, hashlib.md5(related.encode()).hexdigest()
+    )
+
+
+def render_cards(posts):
+    """
+    HTML карточек постов в порядке posts.
+    Готовые карточки берутся из памяти процесса, затем из общего
+    кэша одним get_many; отрисовываются и сохраняются только
+    отсутствующие. Ключ включает отметку изменения поста, имя
+    автора и адрес группы, поэтому их правка сразу даёт новую
+    карточку.
+    """
+    posts = list(posts)
+    keys = [card_cache_key(post) for post in posts]
+    cards = {}
+    for key in keys:
+        card = local_cache.get(key)
+        if card is not None:
+            cards[key] = card
+    _count('local', len(cards), len(keys) - len(cards))
+    if len(cards) < len(keys):
+        shared = cache.get_many([key for key in keys if key not in cards])
+        _count('shared', len(shared), len(keys) - len(cards) - len(shared))
+        for key, card in shared.items():
+            local_cache.set(key, card)
+        cards.update(shared)
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post})
+        for key, post in zip(keys, posts) if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.POSTS_CARD_CACHE_TIMEOUT)
+        for key, card in missing.items():
+            local_cache.set(key, card)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def _scope_key(scope):
+    # В областях бывают имена пользователей и адреса групп
+    # с пробелами и не-ASCII символами, недопустимыми в ключах
+    # memcached, поэтому область хешируется.
+    return LAST_MODIFIED_KEY.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def touch_scopes(scopes, when=None):
+    """
+    Запоминает время последнего изменения областей:
+    'index', 'group:<slug>', 'author:<username>', 'post:<id>'.
+    После фиксации транзакции ставится новая отметка (см.
+    now_and_on_commit), иначе страница, собранная по старому
+    снимку базы, получила бы ETag с окончательной отметкой.
+    """
+    keys = [_scope_key(scope) for scope in scopes]
+
+    def stamp(when=None):
+        cache.set_many(
+            dict.fromkeys(keys, when or timezone.now()),
+            settings.POSTS_SCOPE_STAMP_TIMEOUT
+        )
+
+    now_and_on_commit(stamp, when, keys=keys)
+
+
+def scopes_on_replica(scopes):
+    """Дошли ли до реплики последние изменения областей."""
+    return not replica_lacks(
+        [_scope_key(scope) for scope in scopes]
+    )
+
+
+def get_scope_stamp(scope):
+    """
+    Время последнего изменения области без запросов к базе.
+    Если отметка потеряна, ею становится текущий момент: клиенты
+    один раз получат страницу заново, но устаревший 304 невозможен.
+    """
+    key = _scope_key(scope)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, timezone.now(), settings.POSTS_SCOPE_STAMP_TIMEOUT)
+        stamp = cache.get(key)
+    return stamp
+
+
+def set_post_author(post_id, username):
+    cache.set(
+        POST_AUTHOR_KEY.format(post_id), username,
+        settings.POSTS_SCOPE_STAMP_TIMEOUT
+    )
+
+
+def get_post_author(post_id):
+    """Имя автора поста: из кэша, иначе одним запросом по первичному ключу."""
+    key = POST_AUTHOR_KEY.format(post_id)
+    username = cache.get(key)
+    if username is None:
+        username = Post.objects.filter(pk=post_id).values_list(
+            'author__username', flat=True
+        ).first()
+        # Автор поста не меняется, а нового поста на отстающей
+        # реплике ещё нет: сохранять найденное безопасно.
+        if username is not None:
+            set_post_author(post_id, username)
+    return username
+
+
+def get_group_choices():
+    """
+    Варианты (id, название) для выбора группы. Групп немного,
+    и меняются они редко: список берётся из кэша, чтобы форма
+    со списком групп в каждой строке не читала таблицу групп.
+    """
+    choices = cache.get(GROUP_CHOICES_KEY)
+    if choices is None:
+        choices = list(
+            Group.objects.order_by('title').values_list('pk', 'title')
+        )
+        cache.set(GROUP_CHOICES_KEY, choices, None)
+    return choices
+
+
+def forget_group_choices():
+    cache.delete(GROUP_CHOICES_KEY)
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+
+from .models import COMMENT_PATH_WIDTH, Comment, comment_path_segment
+from .paginators import CommentPaginator
+
+# Следующий за цифрами символ: все потомки пути p лежат
+# в диапазоне [p, p + PATH_END).
+PATH_END = ':'
+
+
+def fill_root_paths(comments):
+    """
+    Пути для комментариев, записанных в обход Comment.save(),
+    например массовой загрузкой: все они становятся корнями веток.
+    """
+    return comments.filter(path='').update(path=LPad(
+        Cast('id', CharField()), COMMENT_PATH_WIDTH, Value('0')
+    ))
+
+
+def _thread_comments(post_id):
+    return Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only(
+        'id', 'text', 'created', 'parent_id', 'path', 'depth',
+        'author_id', 'author__username'
+    ).order_by('path')
+
+
+def _cut_replies(comments, root_id, limit):
+    """
+    Оставляет limit комментариев из limit + 1 прочитанных; у последнего
+    оставшегося more_replies - id корня ветки для ссылки
+    «Показать ещё ответы».
+    """
+    if len(comments) > limit:
+        del comments[limit:]
+        comments[-1].more_replies = root_id
+    return comments
+
+
+def get_threads(post_id, first, last):
+    """
+    Ветки от корня first до корня last включительно в порядке
+    вывода. Один запрос по диапазону индекса (post, path), сколько
+    бы уровней ни было в ветках; из каждой ветки берутся корень
+    и первые POSTS_COMMENT_REPLIES_PER_THREAD ответов, остальные
+    подгружаются get_replies.
+    """
+    table = Comment._meta.db_table
+    limit = settings.POSTS_COMMENT_REPLIES_PER_THREAD
+    start, end = first.path, last.path + PATH_END
+    # Номер комментария в ветке: ветка - общий префикс пути
+    # шириной COMMENT_PATH_WIDTH, корень идёт первым. Лишний
+    # ответ читается, чтобы знать, что в ветке есть ещё.
+    rows = _thread_comments(post_id).filter(
+        path__gte=start, path__lt=end
+    ).extra(
+        where=[
+            f'{table}.id IN (SELECT id FROM (SELECT id, row_number() '
+            f'OVER (PARTITION BY substr(path, 1, %s) ORDER BY path) '
+            f'AS position FROM {table} WHERE post_id = %s '
+            f'AND path >= %s AND path < %s) WHERE position <= %s)'
+        ],
+        params=[COMMENT_PATH_WIDTH, post_id, start, end, limit + 2]
+    )
+    threads = []
+    for comment in rows:
+        if comment.depth == 0:
+            thread = [comment]
+            threads.append(thread)
+        else:
+            thread.append(comment)
+    return [
+        comment
+        for thread in threads
+        for comment in _cut_replies(thread, thread[0].pk, limit + 1)
+    ]
+
+
+def get_replies(post_id, root_id, cursor):
+    """
+    Следующие POSTS_COMMENT_REPLIES_PER_THREAD ответов ветки
+    с корнем root_id после пути cursor (путь последнего
+    показанного ответа).
+    """
+    root = comment_path_segment(root_id)
+    if not (cursor.isdigit() and cursor.startswith(root)):
+        cursor = root
+    limit = settings.POSTS_COMMENT_REPLIES_PER_THREAD
+    return _cut_replies(list(_thread_comments(post_id).filter(
+        path__gt=cursor, path__lt=root + PATH_END
+    )[:limit + 1]), root_id, limit)
+
+
+def get_comments_page(request, post_id):
+    """
+    Страница веток комментариев поста по ?cursor=: корни
+    листаются курсором, ответы приходят вместе со своими ветками
+    (не больше POSTS_COMMENT_REPLIES_PER_THREAD на ветку).
+    """
+    roots = Comment.objects.filter(post_id=post_id, depth=0).only(
+        'id', 'path'
+    )
+    page = CommentPaginator(roots).get_page(request.GET.get('cursor'))
+    if page.object_list:
+        page.object_list = get_threads(
+            post_id, page.object_list[0], page.object_list[-1]
+        )
+    return page
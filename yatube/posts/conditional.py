@@ -0,0 +1,129 @@
+import hashlib
+from functools import wraps
+
+from django.views.decorators.http import condition
+
+from core.routers import reading_primary
+
+from .caching import (get_page_token, get_post_author, get_scope_stamp,
+                      scopes_on_replica)
+
+
+def index_scopes(request):
+    return ['index']
+
+
+def group_scopes(request, slug):
+    return [f'group:{slug}']
+
+
+def profile_scopes(request, username):
+    return [f'author:{username}']
+
+
+def post_scopes(request, post_id):
+    # На странице поста выводится и число постов автора.
+    scopes = [f'post:{post_id}']
+    username = get_post_author(post_id)
+    if username is not None:
+        scopes.append(f'author:{username}')
+    return scopes
+
+
+def comments_scopes(request, post_id):
+    return [f'post:{post_id}']
+
+
+def scope_condition(scopes_func, variant_func=get_page_token):
+    """
+    Декоратор condition с ETag и Last-Modified по отметкам изменения
+    областей. Валидаторы считаются без запроса страницы, поэтому
+    ответ 304 отдаётся до того, как view обратится к ленте.
+    variant_func различает варианты одного адреса: страницы ленты,
+    наборы полей API.
+    """
+    def get_stamps(request, *args, **kwargs):
+        return [
+            get_scope_stamp(scope)
+            for scope in scopes_func(request, *args, **kwargs)
+        ]
+
+    def etag_func(request, *args, **kwargs):
+        stamps = ':'.join(
+            str(stamp.timestamp())
+            for stamp in get_stamps(request, *args, **kwargs)
+        )
+        value = f'{request.path}:{variant_func(request)}:{stamps}'
+        return hashlib.md5(value.encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        return max(get_stamps(request, *args, **kwargs))
+
+    return condition(
+        etag_func=etag_func,
+        last_modified_func=last_modified_func
+    )
+
+
+def _replica_behind(scopes_func, request, *args, **kwargs):
+    """
+    Читает ли запрос реплику, до которой ещё не дошло изменение
+    областей страницы: ETag с новой отметкой закрепил бы у клиента
+    страницу, собранную по старым данным.
+    """
+    if reading_primary():
+        return False
+    return not scopes_on_replica(scopes_func(request, *args, **kwargs))
+
+
+def _without_failed_validators(response):
+    if response.status_code not in (200, 304):
+        del response['ETag']
+        del response['Last-Modified']
+    return response
+
+
+def anonymous_condition(scopes_func):
+    """
+    ETag и Last-Modified для гостей (см. scope_condition).
+    Авторизованным страница отдаётся целиком: в ней есть
+    персональные данные и csrf-токены. Без валидаторов отдаются
+    и страницы областей, изменение которых ещё не дошло до реплики.
+    """
+    def decorator(view):
+        conditional_view = scope_condition(scopes_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.user.is_authenticated
+                    or _replica_behind(scopes_func, request, *args, **kwargs)):
+                return view(request, *args, **kwargs)
+            return _without_failed_validators(
+                conditional_view(request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+def query_variant(request):
+    return request.GET.urlencode()
+
+
+def public_condition(scopes_func):
+    """
+    ETag и Last-Modified для ответов, одинаковых для всех
+    пользователей, например JSON API: вариант ответа задаёт
+    вся строка запроса с курсором и набором полей.
+    """
+    def decorator(view):
+        conditional_view = scope_condition(scopes_func, query_variant)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _replica_behind(scopes_func, request, *args, **kwargs):
+                return view(request, *args, **kwargs)
+            return _without_failed_validators(
+                conditional_view(request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,128 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserCounter
+
+BATCH_SIZE = 500
+
+
+def change_user_counters(user_ids, **deltas):
+    """
+    Атомарно сдвигает счётчики пользователей одним UPDATE
+    с F()-выражением. Строки счётчиков создаются при первом
+    увеличении; уменьшение меняет только существующие строки.
+    """
+    user_ids = list(user_ids)
+    updates = {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+    counters = UserCounter.objects.filter(user_id__in=user_ids)
+    updated = counters.update(**updates)
+    if all(delta <= 0 for delta in deltas.values()):
+        # Строки нет у удаляемого пользователя: каскад удаляет
+        # его счётчик раньше постов и подписок, и созданная
+        # заново строка нарушила бы внешний ключ.
+        return
+    if updated < len(user_ids):
+        existing = set(counters.values_list('user_id', flat=True))
+        for user_id in user_ids:
+            if user_id not in existing:
+                UserCounter.objects.get_or_create(user_id=user_id)
+                UserCounter.objects.filter(user_id=user_id).update(
+                    **updates
+                )
+
+
+def change_user_counter(user_id, **deltas):
+    change_user_counters([user_id], **deltas)
+
+
+def change_comments_counts(post_ids, delta):
+    Post.objects.filter(pk__in=list(post_ids)).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def change_comments_count(post_id, delta):
+    change_comments_counts([post_id], delta)
+
+
+def get_user_counter(user):
+    """Счётчики пользователя без агрегирующих запросов."""
+    try:
+        return user.counter
+    except UserCounter.DoesNotExist:
+        counter, _ = UserCounter.objects.get_or_create(user=user)
+        return counter
+
+
+def _count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def _user_counts():
+    return {
+        'posts_count': _count_subquery(Post.objects.all(), 'author'),
+        'followers_count': _count_subquery(Follow.objects.all(), 'author'),
+        'following_count': _count_subquery(Follow.objects.all(), 'user'),
+    }
+
+
+def _create_missing_counters(users):
+    existing = UserCounter.objects.values_list('user_id', flat=True)
+    UserCounter.objects.bulk_create(
+        [
+            UserCounter(user_id=user_id)
+            for user_id in users.exclude(
+                pk__in=existing
+            ).values_list('pk', flat=True).iterator()
+        ],
+        batch_size=BATCH_SIZE
+    )
+
+
+def recount_users(user_ids):
+    """
+    Пересчитывает счётчики пользователей user_ids по исходным
+    таблицам, например после массовой вставки в обход сигналов.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        _create_missing_counters(User.objects.filter(pk__in=batch))
+        UserCounter.objects.filter(user_id__in=batch).update(
+            **_user_counts()
+        )
+
+
+def recount():
+    """
+    Пересчитывает все счётчики по исходным таблицам.
+    Возвращает число пользователей и постов, у которых
+    значения расходились с фактическими.
+    """
+    _create_missing_counters(User.objects.all())
+    actual = _user_counts()
+    users = UserCounter.objects.annotate(
+        **{f'actual_{field}': actual[field] for field in actual}
+    )
+    stale_users = users.exclude(
+        posts_count=F('actual_posts_count'),
+        followers_count=F('actual_followers_count'),
+        following_count=F('actual_following_count'),
+    ).count()
+    comments_count = _count_subquery(Comment.objects.all(), 'post')
+    posts = Post.objects.annotate(actual_comments_count=comments_count)
+    stale_posts = posts.exclude(
+        comments_count=F('actual_comments_count')
+    ).count()
+    UserCounter.objects.update(**actual)
+    Post.objects.update(comments_count=comments_count)
+    return stale_users, stale_posts
@@ -0,0 +1,128 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import now_and_on_commit, replica_lacks
+from .models import Follow, UserCounter
+
+FOLLOWING_KEY = 'posts:following:{}'
+FOLLOWERS_COUNT_KEY = 'posts:followers_count:{}'
+BACKFILL_KEY = 'posts:backfill_horizons:{}'
+
+
+def get_following_ids(user_id):
+    """
+    Множество id авторов, на которых подписан пользователь.
+    Берётся из кэша, при потере кэша читается из базы
+    по индексу unique_follow и сохраняется снова.
+    """
+    key = FOLLOWING_KEY.format(user_id)
+    following = cache.get(key)
+    if following is None:
+        following = frozenset(Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True))
+        if not replica_lacks([key]):
+            cache.set(key, following, settings.POSTS_FOLLOW_GRAPH_TIMEOUT)
+    return following
+
+
+def get_backfill_horizons(user_id):
+    """
+    {author_id: backfill_horizon} подписок пользователя, посты
+    которых попали в его ленту не все (см. timelines.backfill).
+    Обычно словарь пуст; хранится в кэше рядом с подписками.
+    """
+    key = BACKFILL_KEY.format(user_id)
+    horizons = cache.get(key)
+    if horizons is None:
+        if replica_lacks([key]):
+            return _read_backfill_horizons(user_id)
+        horizons = _store_backfill_horizons(user_id)
+    return horizons
+
+
+def _read_backfill_horizons(user_id):
+    return dict(Follow.objects.filter(
+        user_id=user_id
+    ).exclude(backfill_horizon=None).values_list(
+        'author_id', 'backfill_horizon'
+    ))
+
+
+def _store_backfill_horizons(user_id):
+    horizons = _read_backfill_horizons(user_id)
+    cache.set(
+        BACKFILL_KEY.format(user_id), horizons,
+        settings.POSTS_FOLLOW_GRAPH_TIMEOUT
+    )
+    return horizons
+
+
+def remember_backfill_horizons(user_id):
+    """
+    Сохраняет границы сразу после подписки, чтобы первая страница
+    ленты не читала их из базы (см. now_and_on_commit).
+    """
+    now_and_on_commit(partial(_store_backfill_horizons, user_id))
+
+
+def forget_backfill_horizons(user_ids):
+    """Сбрасывает закэшированные границы после дополнения лент."""
+    keys = [BACKFILL_KEY.format(user_id) for user_id in user_ids]
+    now_and_on_commit(partial(cache.delete_many, keys), keys=keys)
+
+
+def following_among(user_id, author_ids):
+    """На кого из author_ids подписан пользователь."""
+    return get_following_ids(user_id).intersection(author_ids)
+
+
+def is_following(user_id, author_id):
+    return author_id in get_following_ids(user_id)
+
+
+def get_followers_counts(author_ids):
+    """
+    Число подписчиков авторов: {author_id: count}.
+    Значения читаются из кэша одним get_many, недостающие
+    одним запросом к счётчикам.
+    """
+    keys = {FOLLOWERS_COUNT_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    counts = {
+        keys[key]: count for key, count in cache.get_many(keys).items()
+    }
+    missing = [
+        author_id for author_id in keys.values() if author_id not in counts
+    ]
+    if missing:
+        found = dict.fromkeys(missing, 0)
+        found.update(UserCounter.objects.filter(
+            user_id__in=missing
+        ).values_list('user_id', 'followers_count'))
+        counts.update(found)
+        found = {
+            FOLLOWERS_COUNT_KEY.format(author_id): count
+            for author_id, count in found.items()
+        }
+        for key in replica_lacks(found):
+            del found[key]
+        cache.set_many(found, settings.POSTS_FOLLOW_GRAPH_TIMEOUT)
+    return counts
+
+
+def get_followers_count(author_id):
+    return get_followers_counts([author_id])[author_id]
+
+
+def forget_follows(user_id, author_ids):
+    """
+    Сбрасывает закэшированные подписки user_id и число подписчиков
+    авторов (см. now_and_on_commit).
+    """
+    keys = [FOLLOWING_KEY.format(user_id), BACKFILL_KEY.format(user_id)] + [
+        FOLLOWERS_COUNT_KEY.format(author_id) for author_id in author_ids
+    ]
+    now_and_on_commit(partial(cache.delete_many, keys), keys=keys)
@@ -0,0 +1,120 @@
+from django.db import connection, transaction
+
+from .caching import bump_follow_generation, touch_scopes
+from .counters import change_user_counter, change_user_counters
+from .follow_graph import (forget_backfill_horizons, forget_follows,
+                           remember_backfill_horizons)
+from .models import Follow, User
+from .timelines import backfill, backfill_followers, trim
+
+LOOKUP_BATCH_SIZE = 500
+
+
+def _follow_sql():
+    ops = connection.ops
+    meta = Follow._meta
+    return (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(meta.db_table)} '
+        f'({ops.quote_name(meta.get_field("user").column)}, '
+        f'{ops.quote_name(meta.get_field("author").column)}) '
+        f'VALUES (%s, %s) '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+
+
+def _unfollow_sql():
+    ops = connection.ops
+    meta = Follow._meta
+    return (
+        f'DELETE FROM {ops.quote_name(meta.db_table)} '
+        f'WHERE {ops.quote_name(meta.get_field("user").column)} = %s '
+        f'AND {ops.quote_name(meta.get_field("author").column)} = %s'
+    )
+
+
+def resolve_authors(usernames):
+    """{username: id} для существующих пользователей из usernames."""
+    usernames = list(dict.fromkeys(usernames))
+    authors = {}
+    for start in range(0, len(usernames), LOOKUP_BATCH_SIZE):
+        authors.update(User.objects.filter(
+            username__in=usernames[start:start + LOOKUP_BATCH_SIZE]
+        ).values_list('username', 'pk'))
+    return authors
+
+
+def _execute_each(sql, user_id, author_ids):
+    """
+    Выполняет sql для каждой пары и возвращает авторов,
+    для которых строка действительно вставлена или удалена.
+    """
+    changed = []
+    with connection.cursor() as cursor:
+        for author_id in dict.fromkeys(author_ids):
+            if author_id == user_id:
+                continue
+            cursor.execute(sql, [user_id, author_id])
+            if cursor.rowcount:
+                changed.append(author_id)
+    return changed
+
+
+@transaction.atomic
+def follow(user_id, author_ids):
+    """
+    Подписывает user_id на авторов: по одному INSERT ... OR IGNORE
+    на автора без предварительного SELECT. Повтор упирается
+    в ограничение unique_follow и ничего не меняет, поэтому двойной
+    клик и параллельные запросы не дают ни дублей, ни IntegrityError.
+    Возвращает id авторов, подписка на которых появилась.
+    """
+    created = _execute_each(_follow_sql(), user_id, author_ids)
+    if created:
+        followed(user_id, created)
+    return created
+
+
+@transaction.atomic
+def unfollow(user_id, author_ids):
+    """Отписывает user_id от авторов, возвращает id снятых подписок."""
+    deleted = _execute_each(_unfollow_sql(), user_id, author_ids)
+    if deleted:
+        unfollowed(user_id, deleted)
+    return deleted
+
+
+def touch_profiles(user_id, author_ids):
+    """Числа подписчиков и подписок выводятся на странице профиля."""
+    usernames = User.objects.filter(
+        pk__in=[user_id, *author_ids]
+    ).values_list('username', flat=True)
+    touch_scopes([f'author:{username}' for username in usernames])
+
+
+def followed(user_id, author_ids):
+    """Счётчики, кэш графа и ленты после появления подписок."""
+    change_user_counters(author_ids, followers_count=1)
+    change_user_counter(user_id, following_count=len(author_ids))
+    forget_follows(user_id, author_ids)
+    for author_id in author_ids:
+        backfill(user_id, author_id)
+    remember_backfill_horizons(user_id)
+    bump_follow_generation(user_id)
+    touch_profiles(user_id, author_ids)
+
+
+def unfollowed(user_id, author_ids):
+    """Счётчики, кэш графа и ленты после снятия подписок."""
+    change_user_counters(author_ids, followers_count=-1)
+    change_user_counter(user_id, following_count=-len(author_ids))
+    trim(user_id, author_ids)
+    forget_follows(user_id, author_ids)
+    bump_follow_generation(user_id)
+    touch_profiles(user_id, author_ids)
+    # Автор мог опуститься до порога раздачи режима hybrid.
+    followers = backfill_followers(author_ids)
+    if followers:
+        forget_backfill_horizons(followers)
+        for follower_id in followers:
+            bump_follow_generation(follower_id)
@@ -1,7 +1,7 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
-from .models import Post, Comment
+from .models import Comment, Group, Post, User
 
 
 class PostForm(forms.ModelForm):
@@ -22,3 +22,40 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class FollowBulkForm(forms.Form):
+    FOLLOW = 'follow'
+    UNFOLLOW = 'unfollow'
+
+    usernames = forms.CharField(
+        label=_('Имена пользователей'),
+        help_text=_('Через пробел, запятую или с новой строки'),
+        widget=forms.Textarea
+    )
+    action = forms.ChoiceField(
+        choices=((FOLLOW, _('Подписаться')), (UNFOLLOW, _('Отписаться'))),
+        initial=FOLLOW
+    )
+
+    def clean_usernames(self):
+        usernames = self.cleaned_data['usernames'].replace(',', ' ').split()
+        return list(dict.fromkeys(usernames))
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label=_('Поиск'), max_length=200, required=False)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        label=_('Группа'),
+        empty_label=_('Все группы')
+    )
+    author = forms.ModelChoiceField(
+        User.objects.all(),
+        to_field_name='username',
+        required=False,
+        label=_('Автор'),
+        widget=forms.TextInput
+    )
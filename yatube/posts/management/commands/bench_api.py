@@ -0,0 +1,139 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from core.bench import temporary_database
+from posts.caching import local_cache
+from posts.models import Comment, Follow, Group, Post
+from posts.timelines import rebuild
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время ответа HTML-страниц и JSON API на синтетических '
+        'данных: с пустым кэшем, с прогретым кэшем и для API ответом '
+        '304 по ETag. Данные создаются во временной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100,
+                            help='Постов у каждого автора.')
+        parser.add_argument('--comments', type=int, default=50,
+                            help='Комментариев у первого поста.')
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            with temporary_database():
+                data = self.create_data(options)
+                self.run(data, options)
+        finally:
+            # Кэш в памяти процесса общий с рабочим кодом:
+            # карточки синтетических постов в нём не нужны.
+            local_cache.clear()
+
+    def create_data(self, options):
+        prefix = f'bench-{int(time.time())}'
+        group = Group.objects.create(
+            title=prefix, slug=prefix, description=''
+        )
+        reader = User.objects.create_user(username=f'{prefix}-reader')
+        User.objects.bulk_create([
+            User(username=f'{prefix}-{i}') for i in range(options['authors'])
+        ])
+        authors = list(User.objects.filter(
+            username__startswith=f'{prefix}-'
+        ).exclude(pk=reader.pk).values_list('pk', flat=True))
+        Post.objects.bulk_create(
+            (
+                Post(text=f'Пост {i} ' * 20, author_id=author_id,
+                     group=group if i % 2 else None)
+                for i in range(options['posts'])
+                for author_id in authors
+            ),
+            batch_size=500
+        )
+        Follow.objects.bulk_create([
+            Follow(user=reader, author_id=author_id) for author_id in authors
+        ])
+        rebuild([reader.pk])
+        post = Post.objects.filter(author_id=authors[0]).first()
+        Comment.objects.bulk_create([
+            Comment(post=post, author=reader, text=f'Комментарий {i}')
+            for i in range(options['comments'])
+        ])
+        return {
+            'group': group.slug,
+            'author': User.objects.get(pk=authors[0]).username,
+            'post': post.pk,
+            'reader': reader,
+        }
+
+    def pairs(self, data):
+        yield 'index', (reverse('posts:index'), reverse('posts:api_index'))
+        yield 'group', (
+            reverse('posts:group_list', args=[data['group']]),
+            reverse('posts:api_group', args=[data['group']])
+        )
+        yield 'profile', (
+            reverse('posts:profile', args=[data['author']]),
+            reverse('posts:api_profile', args=[data['author']])
+        )
+        yield 'post', (
+            reverse('posts:post_detail', args=[data['post']]),
+            reverse('posts:api_post', args=[data['post']])
+        )
+        yield 'comments', (
+            reverse('posts:post_detail', args=[data['post']]),
+            reverse('posts:api_comments', args=[data['post']])
+        )
+        yield 'follow', (
+            reverse('posts:follow_index'), reverse('posts:api_follow')
+        )
+
+    def measure(self, client, url, repeat, cold, **headers):
+        """Медиана времени ответа в миллисекундах."""
+        timings = []
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+                local_cache.clear()
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), response
+
+    def run(self, data, options):
+        self.stdout.write(
+            f'Постов: {options["authors"] * options["posts"]}, '
+            f'комментариев: {options["comments"]}, медиана из '
+            f'{options["repeat"]} запросов, мс'
+        )
+        guest = Client()
+        reader = Client()
+        reader.force_login(data['reader'])
+        for name, (html, api) in self.pairs(data):
+            client = reader if name == 'follow' else guest
+            repeat = options['repeat']
+            html_cold, _ = self.measure(client, html, repeat, cold=True)
+            html_warm, _ = self.measure(client, html, repeat, cold=False)
+            api_cold, response = self.measure(client, api, repeat, cold=True)
+            api_warm, _ = self.measure(client, api, repeat, cold=False)
+            not_modified, _ = self.measure(
+                client, api, repeat, cold=False,
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            self.stdout.write(
+                f'{name:>9}: HTML {html_cold:.2f} / {html_warm:.2f} '
+                f'(пустой / прогретый кэш), API {api_cold:.2f} / '
+                f'{api_warm:.2f}, API 304 {not_modified:.2f}, '
+                f'{len(response.content)} байт'
+            )
@@ -0,0 +1,116 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.bench import temporary_database
+from posts.models import TIMELINE_KEYS, Follow, Post, UserCounter
+from posts.paginators import POSTS_PER_PAGE, CursorPaginator
+from posts.timelines import MergedFeedPaginator, rebuild
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает способы построения ленты подписок на синтетических '
+        'данных: JOIN подписок и постов, материализованную ленту, '
+        'слияние при чтении и гибрид. Данные создаются во временной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=50,
+                            help='Постов у каждого автора.')
+        parser.add_argument('--popular', type=float, default=0.1,
+                            help='Доля авторов выше порога раздачи.')
+        parser.add_argument('--pages', type=int, default=5,
+                            help='Сколько страниц пролистать за проход.')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with temporary_database() as connection:
+            self.connection = connection
+            reader = self.create_data(options)
+            self.run(reader, options)
+
+    def create_data(self, options):
+        prefix = f'bench-{int(time.time())}'
+        reader = User.objects.create_user(username=f'{prefix}-reader')
+        User.objects.bulk_create([
+            User(username=f'{prefix}-{i}') for i in range(options['authors'])
+        ])
+        authors = list(User.objects.filter(
+            username__startswith=f'{prefix}-'
+        ).exclude(pk=reader.pk).values_list('pk', flat=True))
+        popular = int(len(authors) * options['popular'])
+        UserCounter.objects.bulk_create([
+            UserCounter(user_id=author_id, followers_count=(
+                10 ** 6 if i < popular else 1
+            ))
+            for i, author_id in enumerate(authors)
+        ])
+        Post.objects.bulk_create(
+            (
+                Post(text=f'Пост {i}', author_id=author_id)
+                for i in range(options['posts'])
+                for author_id in authors
+            ),
+            batch_size=500
+        )
+        Follow.objects.bulk_create([
+            Follow(user=reader, author_id=author_id) for author_id in authors
+        ])
+        return reader
+
+    def paginators(self, reader):
+        join = Post.objects.for_feed().by_authors(
+            reader.follower.values('author')
+        )
+        yield 'join', 'timeline', CursorPaginator(join, POSTS_PER_PAGE)
+        yield 'timeline', 'timeline', CursorPaginator(
+            Post.objects.for_feed().timeline(reader), POSTS_PER_PAGE,
+            TIMELINE_KEYS
+        )
+        for strategy in ('merge', 'hybrid'):
+            yield strategy, strategy, MergedFeedPaginator(
+                join, POSTS_PER_PAGE, user=reader
+            )
+
+    def walk(self, paginator, pages):
+        """Время и число запросов каждой из первых pages страниц."""
+        timings = []
+        cursor = None
+        for _ in range(pages):
+            with CaptureQueriesContext(self.connection) as queries:
+                started = time.perf_counter()
+                page = paginator.get_page(cursor)
+                timings.append((time.perf_counter() - started) * 1000)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        return timings, len(queries)
+
+    def run(self, reader, options):
+        self.stdout.write(
+            f'Авторов: {options["authors"]}, '
+            f'постов: {options["authors"] * options["posts"]}'
+        )
+        for name, strategy, paginator in self.paginators(reader):
+            with override_settings(POSTS_FOLLOW_FEED=strategy):
+                entries = rebuild([reader.pk])
+                cache.clear()
+                cold, _ = self.walk(paginator, options['pages'])
+                warm = []
+                for _ in range(options['repeat']):
+                    timings, queries = self.walk(paginator, options['pages'])
+                    warm.extend(timings)
+            self.stdout.write(
+                f'{name:>9}: первая страница {cold[0]:.2f} мс (холодный '
+                f'кэш), медиана {statistics.median(warm):.2f} мс, '
+                f'худшая {max(warm):.2f} мс, запросов на страницу '
+                f'{queries}, строк ленты {entries}'
+            )
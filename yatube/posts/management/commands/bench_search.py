@@ -0,0 +1,152 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.bench import ALIAS, temporary_database
+from posts.models import Group, Post
+from posts.paginators import NEXT, POSTS_PER_PAGE
+from posts.search import drop_triggers, match_expression, rebuild, search_ids
+
+User = get_user_model()
+
+SYLLABLES = (
+    'ба', 'ве', 'го', 'ду', 'жи', 'за', 'ко', 'ла', 'ми', 'но',
+    'пе', 'ро', 'са', 'ту', 'фе', 'ха', 'це', 'чу', 'ша', 'юн',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу FTS5 с LIKE по таблице постов '
+        'на синтетических данных во временной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--words', type=int, default=20000,
+                            help='Размер словаря.')
+        parser.add_argument('--pages', type=int, default=5,
+                            help='Сколько страниц выдачи пролистать.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with temporary_database() as connection:
+            vocabulary = self.setup(connection, options)
+            self.run(vocabulary, options)
+
+    def setup(self, connection, options):
+        rng = random.Random(0)
+        vocabulary = list(dict.fromkeys(
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+            for _ in range(options['words'] * 2)
+        ))[:options['words']]
+        # Частоты слов по закону Ципфа, как в живом тексте.
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)
+        ))
+        User.objects.using(ALIAS).bulk_create(
+            [User(username=f'bench-{i}') for i in range(100)]
+        )
+        Group.objects.using(ALIAS).bulk_create([
+            Group(title=f'Группа {i}', slug=f'group-{i}', description='')
+            for i in range(20)
+        ])
+        authors = list(
+            User.objects.using(ALIAS).values_list('pk', flat=True)
+        )
+        groups = list(
+            Group.objects.using(ALIAS).values_list('pk', flat=True)
+        )
+        now = timezone.now()
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            # Посты загружаются без триггеров, индекс строится один раз.
+            drop_triggers(cursor)
+            batch = []
+            for i in range(options['posts']):
+                date = now - timedelta(seconds=i)
+                batch.append((
+                    ' '.join(rng.choices(
+                        vocabulary, cum_weights=weights, k=rng.randint(10, 60)
+                    )),
+                    date, date, rng.choice(authors), rng.choice(groups)
+                ))
+                if len(batch) == 5000:
+                    self.insert(cursor, batch)
+            self.insert(cursor, batch)
+        loaded = time.perf_counter() - started
+        started = time.perf_counter()
+        rebuild(ALIAS)
+        self.stdout.write(
+            f'Постов: {options["posts"]}, загрузка {loaded:.1f} с, '
+            f'индекс {time.perf_counter() - started:.1f} с'
+        )
+        return vocabulary
+
+    def insert(self, cursor, batch):
+        cursor.executemany(
+            'INSERT INTO posts_post (text, pub_date, updated, author_id, '
+            "group_id, image, comments_count) VALUES (%s, %s, %s, %s, %s, "
+            "'', 0)",
+            batch
+        )
+        batch.clear()
+
+    def walk(self, match, group_id, pages):
+        """Время первых pages страниц выдачи по курсору."""
+        timings = []
+        rank = pk = None
+        for _ in range(pages):
+            started = time.perf_counter()
+            rows = search_ids(
+                match, NEXT, rank, pk, POSTS_PER_PAGE + 1,
+                group_id=group_id, using=ALIAS
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            if len(rows) <= POSTS_PER_PAGE:
+                break
+            pk, rank = rows[POSTS_PER_PAGE - 1]
+        return timings
+
+    def like(self, query):
+        """Прежний поиск админки: LIKE по тексту и подсчёт совпадений."""
+        started = time.perf_counter()
+        posts = Post.objects.using(ALIAS).filter(text__icontains=query)
+        posts.count()
+        list(posts.values_list('pk', flat=True)[:POSTS_PER_PAGE])
+        return (time.perf_counter() - started) * 1000
+
+    def run(self, vocabulary, options):
+        group_id = Group.objects.using(ALIAS).values_list(
+            'pk', flat=True
+        ).first()
+        queries = {
+            'частое слово': vocabulary[5],
+            'среднее слово': vocabulary[len(vocabulary) // 20],
+            'редкое слово': vocabulary[-1],
+            'два слова': f'{vocabulary[5]} {vocabulary[50]}',
+        }
+        for name, query in queries.items():
+            match = match_expression(query)
+            first, deep, grouped, like = [], [], [], []
+            for _ in range(options['repeat']):
+                timings = self.walk(match, None, options['pages'])
+                first.append(timings[0])
+                deep.append(timings[-1])
+                grouped.append(
+                    self.walk(match, group_id, options['pages'])[0]
+                )
+                like.append(self.like(query))
+            self.stdout.write(
+                f'{name:>14}: FTS5 первая страница '
+                f'{statistics.median(first):.1f} мс, '
+                f'{len(timings)}-я {statistics.median(deep):.1f} мс, '
+                f'в группе {statistics.median(grouped):.1f} мс; '
+                f'LIKE {statistics.median(like):.1f} мс'
+            )
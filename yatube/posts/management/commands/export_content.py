@@ -0,0 +1,56 @@
+import sys
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exports import CONTENT_TYPES, ZIP, export_chunks
+from posts.models import Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты автора или группы в JSONL, CSV или ZIP '
+        'с картинками. Посты читаются порциями, поэтому память '
+        'не зависит от их числа.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--author', help='username автора.')
+        source.add_argument('--group', help='slug группы.')
+        parser.add_argument('--format', choices=list(CONTENT_TYPES),
+                            default='jsonl')
+        parser.add_argument('--output', default='-',
+                            help='Файл или - для stdout.')
+
+    def handle(self, *args, **options):
+        if options['author']:
+            source = User.objects.filter(username=options['author'])
+            field = 'author'
+        else:
+            source = Group.objects.filter(slug=options['group'])
+            field = 'group'
+        pk = source.values_list('pk', flat=True).first()
+        if pk is None:
+            raise CommandError(
+                f'Не найдено: {options["author"] or options["group"]}'
+            )
+        posts = Post.objects.filter(**{field: pk})
+        fmt = options['format']
+        binary = fmt == ZIP
+        if options['output'] == '-':
+            write = (
+                sys.stdout.buffer.write if binary
+                else partial(self.stdout.write, ending='')
+            )
+            self.write_chunks(write, posts, fmt)
+            return
+        with open(options['output'], 'wb' if binary else 'w',
+                  encoding=None if binary else 'utf-8',
+                  newline=None if binary else '') as output:
+            self.write_chunks(output.write, posts, fmt)
+        self.stderr.write(f'Выгружено в {options["output"]}.')
+
+    def write_chunks(self, write, posts, fmt):
+        for chunk in export_chunks(posts, fmt):
+            write(chunk)
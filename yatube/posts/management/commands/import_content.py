@@ -0,0 +1,380 @@
+import csv
+import json
+import resource
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (IntegrityError, connections, reset_queries, router,
+                       transaction)
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.caching import (bump_feed_generation, bump_follow_generation,
+                           touch_scopes)
+from posts.comments import fill_root_paths
+from posts.counters import (change_comments_counts, change_user_counters,
+                            recount, recount_users)
+from posts.follow_graph import forget_follows
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import create_triggers, drop_triggers, rebuild
+from posts.timelines import forget_recent
+from posts.timelines import rebuild as rebuild_timelines
+
+POSTS = 'posts'
+COMMENTS = 'comments'
+FOLLOWS = 'follows'
+MODELS = {POSTS: Post, COMMENTS: Comment, FOLLOWS: Follow}
+LOOKUP_BATCH_SIZE = 500
+
+
+def read_rows(stream, fmt):
+    """Строки файла по одной: (номер строки, словарь полей)."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            raise CommandError(f'Строка {number}: {error}')
+
+
+def insert_many(model, objects, using, ignore_conflicts=False):
+    """
+    Вставляет объекты одним executemany. bulk_create на SQLite
+    склеивает пачку в составной SELECT ... UNION ALL, и разбор такого
+    запроса обходится дороже самой вставки. Значения полей берутся
+    как есть, без pre_save: даты auto_now из файла сохраняются.
+    Строка с пустым id получает следующий id от SQLite.
+    Возвращает число вставленных строк.
+    """
+    connection = connections[using]
+    ops = connection.ops
+    fields = model._meta.concrete_fields
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=ignore_conflicts)} '
+        f'{ops.quote_name(model._meta.db_table)} '
+        f'({", ".join(ops.quote_name(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))}) '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [
+                field.get_db_prep_save(
+                    getattr(obj, field.attname), connection
+                )
+                for field in fields
+            ]
+            for obj in objects
+        ])
+        return cursor.rowcount
+
+
+def by_delta(values):
+    """{сдвиг: [значения]} по числу повторов каждого значения."""
+    groups = defaultdict(list)
+    for value, delta in Counter(values).items():
+        groups[delta].append(value)
+    return groups.items()
+
+
+def memory_peak():
+    """
+    Пик занятой процессом памяти в мегабайтах (ru_maxrss в КБ).
+    Сюда входят и кэш страниц SQLite, и отображённый в память
+    файл базы (mmap_size в SQLITE_PRAGMAS).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии или подписки из JSONL или CSV '
+        'пачками в транзакциях по --chunk-size строк. Авторы и группы '
+        'ищутся по username и slug, строки с неизвестными ссылками '
+        'пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(MODELS))
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='По умолчанию по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк в одном INSERT.')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Строк в одной транзакции.')
+        parser.add_argument(
+            '--defer', action='store_true',
+            help='Пересчитать счётчики, построить индексы и поиск '
+                 'один раз в конце, а не по ходу загрузки.'
+        )
+
+    def handle(self, *args, **options):
+        self.kind = options['kind']
+        self.model = MODELS[self.kind]
+        self.using = router.db_for_write(self.model)
+        self.defer = options['defer']
+        self.imported = self.skipped = 0
+        self.authors = set()
+        self.followers = set()
+        fmt = options['format'] or (
+            'csv' if options['path'].endswith('.csv') else 'jsonl'
+        )
+        self.load_lookups()
+        started = time.perf_counter()
+        stream = (
+            sys.stdin if options['path'] == '-'
+            else open(options['path'], encoding='utf-8', newline='')
+        )
+        with stream, self.deferred():
+            rows = read_rows(stream, fmt)
+            while self.import_chunk(rows, options):
+                self.report(started)
+        loaded = time.perf_counter() - started
+        self.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {self.imported}, пропущено {self.skipped}: '
+            f'загрузка {loaded:.1f} с, вместе с обслуживанием '
+            f'{time.perf_counter() - started:.1f} с, '
+            f'пик памяти {memory_peak():.0f} МБ.'
+        ))
+
+    def load_lookups(self):
+        """Словари username -> id и slug -> id в памяти процесса."""
+        self.users = dict(User.objects.using(self.using).values_list(
+            'username', 'pk'
+        ).iterator())
+        self.groups = dict(Group.objects.using(self.using).values_list(
+            'slug', 'pk'
+        ))
+
+    def report(self, started):
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f'{self.kind}: {self.imported} строк за {seconds:.1f} с, '
+            f'{self.imported / seconds if seconds else 0:.0f} строк/с'
+        )
+
+    @contextmanager
+    def deferred(self):
+        """
+        С --defer на время загрузки снимает вторичные индексы модели
+        и триггеры поиска, а в конце возвращает их, перестраивает
+        индекс поиска и пересчитывает счётчики. Всё это выполняется
+        и при ошибке: уже зафиксированные пачки остаются в базе.
+        """
+        if not self.defer:
+            yield
+            return
+        connection = connections[self.using]
+        indexes = self.model._meta.indexes
+        with connection.cursor() as cursor:
+            for index in indexes:
+                cursor.execute(
+                    f'DROP INDEX IF EXISTS '
+                    f'{connection.ops.quote_name(index.name)}'
+                )
+            if self.kind == POSTS:
+                drop_triggers(cursor)
+        try:
+            yield
+        finally:
+            editor = connection.schema_editor(atomic=False)
+            with transaction.atomic(self.using):
+                with connection.cursor() as cursor:
+                    for index in indexes:
+                        cursor.execute(str(index.create_sql(
+                            self.model, editor
+                        )))
+                    if self.kind == POSTS:
+                        create_triggers(cursor)
+                if self.kind == POSTS:
+                    rebuild(self.using)
+                recount()
+
+    def import_chunk(self, rows, options):
+        """Одна транзакция: до chunk_size строк пачками по batch_size."""
+        chunk = islice(rows, options['chunk_size'])
+        read = 0
+        with transaction.atomic(self.using):
+            while True:
+                batch = list(islice(chunk, options['batch_size']))
+                if not batch:
+                    break
+                read += len(batch)
+                self.import_batch(batch)
+                # При DEBUG каждый запрос со всеми значениями пачки
+                # запоминается в connection.queries.
+                reset_queries()
+        return read
+
+    def import_batch(self, batch):
+        try:
+            objects = getattr(self, f'prepare_{self.kind}')(batch)
+        except KeyError as error:
+            raise CommandError(f'В строке нет поля {error}')
+        try:
+            inserted = insert_many(
+                self.model, objects, self.using,
+                ignore_conflicts=self.kind == FOLLOWS
+            ) if objects else 0
+        except IntegrityError as error:
+            # executemany не сообщает, какая строка пачки не прошла.
+            raise CommandError(
+                f'Строки {batch[0][0]}-{batch[-1][0]}: {error}'
+            )
+        self.imported += inserted
+        self.skipped += len(batch) - inserted
+        getattr(self, f'after_{self.kind}')(objects, batch)
+
+    def parse_date(self, number, value):
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise CommandError(f'Строка {number}: неверная дата {value}')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
+
+    def parse_id(self, number, field, value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise CommandError(f'Строка {number}: неверный {field} {value}')
+
+    def prepare_posts(self, batch):
+        posts = []
+        # Явные id и номера строк: повтор id иначе обнаружится
+        # только ошибкой INSERT без номера строки.
+        lines = {}
+        for number, row in batch:
+            author_id = self.users.get(row['author'])
+            group = row.get('group')
+            group_id = self.groups.get(group) if group else None
+            if author_id is None or (group and group_id is None):
+                continue
+            pub_date = self.parse_date(number, row.get('pub_date'))
+            pk = row.get('id') or None
+            if pk is not None:
+                pk = self.parse_id(number, 'id', pk)
+                if pk in lines:
+                    raise CommandError(
+                        f'Строка {number}: id {pk} уже был '
+                        f'в строке {lines[pk]}'
+                    )
+                lines[pk] = number
+            posts.append(Post(
+                pk=pk, text=row['text'],
+                author_id=author_id, group_id=group_id,
+                pub_date=pub_date, updated=pub_date
+            ))
+        existing = Post.objects.using(self.using).filter(
+            pk__in=lines
+        ).values_list('pk', flat=True)
+        if existing:
+            pk = min(existing, key=lines.get)
+            raise CommandError(
+                f'Строка {lines[pk]}: пост с id {pk} уже есть'
+            )
+        return posts
+
+    def prepare_comments(self, batch):
+        post_ids = [
+            self.parse_id(number, 'post', row['post']) for number, row in batch
+        ]
+        existing = set(Post.objects.using(self.using).filter(
+            pk__in=set(post_ids)
+        ).values_list('pk', flat=True))
+        # Новые комментарии получат id больше этого: по нему
+        # after_comments найдёт их, чтобы записать пути.
+        self.last_comment_id = Comment.objects.using(self.using).aggregate(
+            value=Max('pk')
+        )['value'] or 0
+        comments = []
+        for (number, row), post_id in zip(batch, post_ids):
+            author_id = self.users.get(row['author'])
+            if author_id is None or post_id not in existing:
+                continue
+            comments.append(Comment(
+                post_id=post_id, author_id=author_id, text=row['text'],
+                created=self.parse_date(number, row.get('created'))
+            ))
+        return comments
+
+    def prepare_follows(self, batch):
+        follows = []
+        for _, row in batch:
+            user_id = self.users.get(row['user'])
+            author_id = self.users.get(row['author'])
+            if None in (user_id, author_id) or user_id == author_id:
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        return follows
+
+    def after_posts(self, posts, batch):
+        authors = [post.author_id for post in posts]
+        self.authors.update(authors)
+        if not self.defer:
+            for delta, author_ids in by_delta(authors):
+                change_user_counters(author_ids, posts_count=delta)
+        for author_id in set(authors):
+            forget_recent(author_id)
+        touch_scopes({'index'} | {
+            f'author:{row["author"]}' for _, row in batch
+        } | {
+            f'group:{row["group"]}' for _, row in batch if row.get('group')
+        })
+
+    def after_comments(self, comments, batch):
+        posts = [comment.post_id for comment in comments]
+        fill_root_paths(Comment.objects.using(self.using).filter(
+            pk__gt=self.last_comment_id
+        ))
+        if not self.defer:
+            for delta, post_ids in by_delta(posts):
+                change_comments_counts(post_ids, delta)
+        touch_scopes({f'post:{post_id}' for post_id in posts})
+
+    def after_follows(self, follows, batch):
+        # Часть подписок могла уже существовать (ignore_conflicts),
+        # поэтому счётчики пересчитываются, а не сдвигаются.
+        following = {}
+        for follow in follows:
+            following.setdefault(follow.user_id, set()).add(follow.author_id)
+        self.followers.update(following)
+        if not self.defer:
+            recount_users(set(following).union(*following.values()))
+        for user_id, author_ids in following.items():
+            forget_follows(user_id, author_ids)
+            bump_follow_generation(user_id)
+
+    def finish(self):
+        """Ленты подписок затронутых читателей и поколение лент."""
+        followers = set(self.followers)
+        authors = list(self.authors)
+        for start in range(0, len(authors), LOOKUP_BATCH_SIZE):
+            followers.update(Follow.objects.using(self.using).filter(
+                author_id__in=authors[start:start + LOOKUP_BATCH_SIZE]
+            ).values_list('user_id', flat=True))
+        followers = list(followers)
+        for start in range(0, len(followers), LOOKUP_BATCH_SIZE):
+            with transaction.atomic(self.using):
+                rebuild_timelines(
+                    followers[start:start + LOOKUP_BATCH_SIZE]
+                )
+        for user_id in followers:
+            bump_follow_generation(user_id)
+        bump_feed_generation()
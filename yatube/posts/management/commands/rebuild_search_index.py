@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+
+from posts.models import Post
+from posts.search import create_triggers, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов и восстанавливает '
+        'триггеры, которые держат его в согласии с таблицей постов.'
+    )
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(Post)
+        with transaction.atomic(using):
+            with connections[using].cursor() as cursor:
+                create_triggers(cursor)
+            posts = rebuild(using)
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов в индексе: {posts}.'
+        ))
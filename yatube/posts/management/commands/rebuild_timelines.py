@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.timelines import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Собирает ленты подписок заново по подпискам и постам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='user_ids',
+            type=int,
+            help='id пользователя, чью ленту нужно перестроить.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            entries = rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {entries}.'
+        ))
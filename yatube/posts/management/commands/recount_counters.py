@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stale_users, stale_posts = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {stale_users}, '
+            f'постов {stale_posts}.'
+        ))
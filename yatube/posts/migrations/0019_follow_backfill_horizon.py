@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='backfill_horizon',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
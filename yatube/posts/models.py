@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 
 User = get_user_model()
 
+TIMELINE_KEYS = ('timeline_date', 'timeline_post')
+TIMELINE_ORDERING = [f'-{key}' for key in TIMELINE_KEYS]
+
+COMMENT_PATH_WIDTH = 10
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -13,9 +19,52 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Посты для лент: автор и группа подтягиваются одним JOIN,
+        из связанных таблиц читаются только нужные карточке поля.
+        """
+        return self.select_related('author', 'group').only(
+            'id', 'text', 'pub_date', 'updated', 'image',
+            'author_id', 'group_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__slug', 'group__title',
+        )
+
+    def by_authors(self, authors):
+        """
+        Посты авторов из подзапроса authors.
+        Условие строится по выражению author_id + 0, чтобы SQLite
+        не выбирал индекс по автору с последующей сортировкой,
+        а шёл по индексу pub_date и останавливался на LIMIT.
+        """
+        return self.annotate(
+            author_key=models.F('author_id') + 0
+        ).filter(author_key__in=authors)
+
+    def timeline(self, user):
+        """
+        Посты из материализованной ленты подписок user.
+        Сортировка и условия курсора идут по копиям ключа
+        в TimelineEntry (аннотации TIMELINE_KEYS), поэтому страница
+        читается диапазоном индекса (user, pub_date, post).
+        """
+        return self.annotate(
+            entry=models.FilteredRelation(
+                'timeline_entries',
+                condition=models.Q(timeline_entries__user=user)
+            )
+        ).filter(entry__isnull=False).annotate(
+            timeline_date=models.F('entry__pub_date'),
+            timeline_post=models.F('entry__post'),
+        ).order_by(*TIMELINE_ORDERING)
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -33,15 +82,44 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+def comment_path_segment(pk):
+    """Часть пути комментария: id фиксированной ширины."""
+    return str(pk).zfill(COMMENT_PATH_WIDTH)
+
+
 class Comment(models.Model):
+    """
+    Комментарий или ответ на него. path - материализованный путь:
+    id всех предков и самого комментария, каждый шириной
+    COMMENT_PATH_WIDTH. Сортировка по path выводит ветки целиком,
+    ответы сразу за родителем, а поддерево - это диапазон path.
+    """
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -54,6 +132,52 @@ class Comment(models.Model):
     )
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies'
+    )
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx'
+            ),
+            models.Index(
+                fields=['post', 'depth', 'path'],
+                name='comment_post_depth_path_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        prefix = ''
+        if self.parent_id and not self.path:
+            parent = self.parent
+            self.post_id = parent.post_id
+            prefix = parent.path
+            self.depth = parent.depth + 1
+            if self.depth > settings.POSTS_COMMENT_MAX_DEPTH:
+                # Глубже не вкладываем: ответ встаёт рядом с родителем.
+                prefix = prefix[:-COMMENT_PATH_WIDTH]
+                self.parent_id = parent.parent_id
+                Comment.parent.field.delete_cached_value(self)
+                self.depth -= 1
+        super().save(*args, **kwargs)
+        if not self.path:
+            # Путь включает собственный id, известный только
+            # после вставки.
+            self.path = prefix + comment_path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Follow(models.Model):
@@ -67,6 +191,11 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+    # Ленту при подписке дополняют только последние посты автора:
+    # посты с pub_date не новее этой отметки в ней могут отсутствовать.
+    backfill_horizon = models.DateTimeField(
+        null=True, blank=True, editable=False
+    )
 
     class Meta:
         constraints = [
@@ -75,3 +204,62 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Строка материализованной ленты подписок: пост автора,
+    на которого подписан user. pub_date и author скопированы из поста,
+    чтобы читать ленту и убирать из неё автора без JOIN.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        db_index=False
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
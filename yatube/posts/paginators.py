@@ -0,0 +1,228 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+COMMENT_KEYS = ('created', 'id')
+COMMENT_PATH_KEYS = ('path', 'id')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+PAGES_ON_EACH_SIDE = 2
+PAGES_ON_ENDS = 1
+
+
+def encode_cursor(direction, key, pk):
+    """Упаковывает позицию (ключ сортировки, id) в непрозрачный токен."""
+    value = f'{direction}|{key}|{pk}'
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(token, parse_key=parse_datetime):
+    """
+    Возвращает (direction, ключ, id) или None,
+    если токен повреждён.
+    """
+    try:
+        direction, key, pk = force_str(
+            urlsafe_base64_decode(token)
+        ).split('|')
+        key = parse_key(key)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or key is None:
+        return None
+    return direction, key, pk
+
+
+def keyset_filter(keys, pub_date, pk, descending):
+    """Условие «после позиции (pub_date, pk)» в порядке сортировки."""
+    date_key, id_key = keys
+    lookup = 'lt' if descending else 'gt'
+    return (
+        Q(**{f'{date_key}__{lookup}': pub_date})
+        | Q(**{date_key: pub_date, f'{id_key}__{lookup}': pk})
+    )
+
+
+def keyset_ordering(keys, descending):
+    sign = '-' if descending else ''
+    return [f'{sign}{key}' for key in keys]
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset-пагинатор по (pub_date, id).
+    Страница выбирается условием по ключу сортировки, поэтому
+    не нужны ни OFFSET, ни COUNT: стоимость запроса не зависит
+    от глубины страницы.
+    keys задаёт поля, по которым строятся условие и сортировка,
+    если значения pub_date и id хранятся ещё и в другой таблице.
+    При ascending лента идёт от старых к новым.
+    """
+    is_cursor = True
+    ascending = False
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id')):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+        self._number = 1
+        self._has_next = False
+
+    @property
+    def num_pages(self):
+        # Общее число страниц неизвестно: достаточно того,
+        # чтобы Page.has_next/has_previous отвечали правильно.
+        return self._number + self._has_next
+
+    def cursor_key(self, obj):
+        """Первый ключ сортировки объекта в виде строки для курсора."""
+        return obj.pub_date.isoformat()
+
+    def cursor_pk(self, obj):
+        return obj.pk
+
+    def parse_cursor_key(self, value):
+        return parse_datetime(value)
+
+    def fetch(self, direction, pub_date, pk, limit):
+        """
+        До limit объектов после позиции в направлении direction:
+        для NEXT от новых к старым, для PREVIOUS от старых к новым
+        (при ascending наоборот). Без позиции (pub_date is None)
+        берётся начало ленты.
+        """
+        descending = (direction == NEXT) != self.ascending
+        queryset = self.object_list
+        if pub_date is not None:
+            queryset = queryset.filter(
+                keyset_filter(self.keys, pub_date, pk, descending)
+            )
+        return list(
+            queryset.order_by(*keyset_ordering(self.keys, descending))[
+                :limit
+            ]
+        )
+
+    def encode_cursor(self, direction, obj):
+        return encode_cursor(
+            direction, self.cursor_key(obj), self.cursor_pk(obj)
+        )
+
+    def get_page(self, cursor):
+        position = (
+            decode_cursor(cursor, self.parse_cursor_key) if cursor else None
+        )
+        direction, pub_date, pk = position or (NEXT, None, None)
+        rows = self.fetch(direction, pub_date, pk, self.per_page + 1)
+        if direction == NEXT:
+            has_previous = position is not None
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        else:
+            has_next = True
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+        self._number = 2 if has_previous else 1
+        self._has_next = has_next and bool(rows)
+        page = Page(rows, self._number, self)
+        page.next_cursor = (
+            self.encode_cursor(NEXT, rows[-1]) if self._has_next else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(PREVIOUS, rows[0])
+            if has_previous and rows else None
+        )
+        return page
+
+
+class CommentPaginator(CursorPaginator):
+    """
+    Ветки комментариев по порядку пути (path, id): object_list -
+    корневые комментарии, страница читается диапазоном индекса
+    (post, depth, path).
+    """
+    ascending = True
+
+    def __init__(self, object_list, per_page=COMMENTS_PER_PAGE,
+                 keys=COMMENT_PATH_KEYS):
+        super().__init__(object_list, per_page, keys)
+
+    def cursor_key(self, obj):
+        return obj.path
+
+    def parse_cursor_key(self, value):
+        return value if value.isdigit() else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Нумерованный пагинатор для больших таблиц. Без фильтров число
+    строк оценивается по крайним id поисками по первичному
+    ключу вместо COUNT(*) по всей таблице; удалённые строки в оценку
+    входят, поэтому последние страницы могут оказаться неполными.
+    С фильтрами число считается точно: условие сужает выборку.
+    """
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.where:
+            return super().count
+        # SQLite берёт min и max из индекса, только если в запросе
+        # одна такая функция, поэтому запросов два.
+        rows = self.object_list.model._default_manager.using(
+            self.object_list.db
+        )
+        first = rows.aggregate(value=Min('pk'))['value']
+        if first is None:
+            return 0
+        return rows.aggregate(value=Max('pk'))['value'] - first + 1
+
+
+def get_page_window(page, on_each_side=PAGES_ON_EACH_SIDE,
+                    on_ends=PAGES_ON_ENDS):
+    """
+    Номера страниц вокруг текущей плюс первые и последние.
+    Пропуски обозначаются None, поэтому длина списка
+    не зависит от общего числа страниц. Как и в
+    Paginator.get_elided_page_range, пропуск заменяет
+    не меньше двух страниц.
+    """
+    num_pages = page.paginator.num_pages
+    number = page.number
+    window = []
+    if number > on_each_side + on_ends + 2:
+        window.extend(range(1, on_ends + 1))
+        window.append(None)
+        window.extend(range(number - on_each_side, number + 1))
+    else:
+        window.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        window.extend(range(number + 1, number + on_each_side + 1))
+        window.append(None)
+        window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        window.extend(range(number + 1, num_pages + 1))
+    return window
+
+
+def get_page_obj(request, object_list, keys=('pub_date', 'id'),
+                 paginator_class=CursorPaginator):
+    """
+    Страница ленты для запроса.
+    По умолчанию и при ?cursor= используется keyset-пагинация,
+    ?page=N оставлен для совместимости со старыми ссылками.
+    """
+    if 'page' in request.GET and 'cursor' not in request.GET:
+        paginator = Paginator(object_list, POSTS_PER_PAGE)
+        page = paginator.get_page(request.GET.get('page'))
+        page.page_window = get_page_window(page)
+        return page
+    paginator = paginator_class(object_list, POSTS_PER_PAGE, keys)
+    return paginator.get_page(request.GET.get('cursor'))
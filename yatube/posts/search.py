@@ -0,0 +1,213 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import Post
+from .paginators import NEXT, POSTS_PER_PAGE, CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+
+# Внешнее содержимое: FTS5 хранит только индекс, текст читается
+# из posts_post по rowid = id. unicode61 разбивает текст на слова
+# по Unicode и сравнивает их без учёта регистра, в том числе
+# для кириллицы.
+CREATE_TABLE = (
+    f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')"
+)
+DROP_TABLE = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+
+TRIGGERS = {
+    'posts_post_fts_insert': (
+        'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+    'posts_post_fts_delete': (
+        'AFTER DELETE ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        'END'
+    ),
+    'posts_post_fts_update': (
+        'AFTER UPDATE OF text ON posts_post '
+        'WHEN old.text IS NOT new.text BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+        "VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+}
+
+WORD = re.compile(r'\w+')
+
+
+def create_triggers(cursor):
+    """Триггеры, которые держат индекс в согласии с posts_post."""
+    for name, body in TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def drop_triggers(cursor):
+    """
+    Снимает триггеры на время массовой загрузки постов:
+    после неё индекс собирается заново rebuild().
+    """
+    for name in TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def rebuild(using=None):
+    """Перестраивает индекс по posts_post и сжимает его."""
+    using = using or router.db_for_write(Post)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+        )
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def match_expression(query):
+    """
+    Запрос пользователя в синтаксисе MATCH: каждое слово берётся
+    в кавычки, последнее ищется и как префикс. Операторы FTS5
+    из ввода не проходят, поэтому синтаксических ошибок не бывает.
+    None, если в запросе нет ни одного слова.
+    """
+    words = WORD.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def matching(queryset, query):
+    """
+    Посты queryset, содержащие все слова запроса. Порядок
+    не меняется: подходит там, где ранжирование не нужно.
+    """
+    match = match_expression(query)
+    if match is None:
+        return queryset.none()
+    # filter(id__in=RawSQL(...)) даёт IN ((SELECT ...)) с лишними
+    # скобками, и SQLite берёт из подзапроса только первую строку.
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match]
+    )
+
+
+def search_ids(match, direction, rank, pk, limit, group_id=None,
+               author_id=None, using=None):
+    """
+    До limit пар (id, rank) после позиции (rank, pk): для NEXT
+    от лучших совпадений (меньший bm25) к худшим, для PREVIOUS
+    обратно. Без позиции (rank is None) берётся начало выдачи.
+    """
+    using = using or router.db_for_read(Post)
+    descending = direction != NEXT
+    joins, filters, filter_params = '', [], []
+    if group_id is not None or author_id is not None:
+        joins = f'JOIN posts_post AS p ON p.id = {FTS_TABLE}.rowid'
+    if group_id is not None:
+        filters.append('p.group_id = %s')
+        filter_params.append(group_id)
+    if author_id is not None:
+        filters.append('p.author_id = %s')
+        filter_params.append(author_id)
+    # Ранжируются только последние POSTS_SEARCH_CANDIDATES совпадений
+    # с учётом фильтров: иначе слово, которое есть в половине постов,
+    # заставило бы считать bm25 для половины таблицы на каждой
+    # странице. Граница окна ищется по тем же фильтрам, чтобы поиск
+    # в группе или у автора не упирался в чужие свежие посты.
+    where = ' AND '.join([f'{FTS_TABLE} MATCH %s', *filters])
+    conditions = [
+        where,
+        f'{FTS_TABLE}.rowid >= coalesce(('
+        f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} {joins} '
+        f'WHERE {where} '
+        f'ORDER BY {FTS_TABLE}.rowid DESC LIMIT 1 OFFSET %s), 0)',
+    ]
+    params = [
+        match, *filter_params,
+        match, *filter_params, settings.POSTS_SEARCH_CANDIDATES - 1,
+    ]
+    if rank is not None:
+        lookup = '<' if descending else '>'
+        conditions.append(
+            f'({FTS_TABLE}.rank, {FTS_TABLE}.rowid) {lookup} (%s, %s)'
+        )
+        params.extend([rank, pk])
+    order = 'DESC' if descending else 'ASC'
+    params.append(limit)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT {FTS_TABLE}.rowid, {FTS_TABLE}.rank '
+            f'FROM {FTS_TABLE} {joins} '
+            f'WHERE {" AND ".join(conditions)} '
+            f'ORDER BY {FTS_TABLE}.rank {order}, '
+            f'{FTS_TABLE}.rowid {order} LIMIT %s',
+            params
+        )
+        return cursor.fetchall()
+
+
+class SearchPaginator(CursorPaginator):
+    """
+    Выдача поиска по релевантности с keyset-пагинацией по (rank, id).
+    bm25 зависит от всего индекса, поэтому новые посты могут
+    немного сдвинуть границу страниц, но не дают пропусков
+    в пределах одного состояния индекса.
+    """
+
+    def __init__(self, object_list, per_page, match=None, group_id=None,
+                 author_id=None):
+        super().__init__(object_list, per_page)
+        self.match = match
+        self.group_id = group_id
+        self.author_id = author_id
+
+    def cursor_key(self, obj):
+        return repr(obj.search_rank)
+
+    def parse_cursor_key(self, value):
+        return float(value)
+
+    def fetch(self, direction, rank, pk, limit):
+        rows = search_ids(
+            self.match, direction, rank, pk, limit,
+            self.group_id, self.author_id, self.object_list.db
+        )
+        posts = self.object_list.in_bulk(
+            [post_id for post_id, _ in rows]
+        )
+        page = []
+        for post_id, rank in rows:
+            if post_id in posts:
+                posts[post_id].search_rank = rank
+                page.append(posts[post_id])
+        return page
+
+
+def get_search_page(request, q, group=None, author=None):
+    """
+    Страница выдачи по запросу q, при необходимости только
+    в группе или у автора. None, если в запросе нет слов.
+    """
+    match = match_expression(q)
+    if match is None:
+        return None
+    paginator = SearchPaginator(
+        Post.objects.for_feed(), POSTS_PER_PAGE, match,
+        group_id=group.pk if group else None,
+        author_id=author.pk if author else None
+    )
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,180 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .caching import (bump_feed_generation, forget_group_choices,
+                      set_post_author, touch_scopes)
+from .counters import change_comments_count, change_user_counter
+from .follows import followed, unfollowed
+from .models import Comment, Follow, Group, Post, User, UserCounter
+from .timelines import fan_out, forget_recent
+
+
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def create_user_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+def author_pages_changed(usernames):
+    """
+    Имя автора выводится в карточках его постов на главной,
+    в группах, на его странице и страницах его постов.
+    """
+    slugs = Group.objects.filter(
+        posts__author__username__in=usernames
+    ).values_list('slug', flat=True).distinct()
+    bump_feed_generation()
+    touch_scopes(
+        ['index']
+        + [f'author:{username}' for username in usernames]
+        + [f'group:{slug}' for slug in slugs]
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login.
+    instance._old_names = None
+    if (instance.pk and not raw and (
+            update_fields is None
+            or set(update_fields) & set(USER_NAME_FIELDS))):
+        instance._old_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    old_names = getattr(instance, '_old_names', None)
+    if created or raw or old_names is None:
+        return
+    names = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if names != old_names:
+        author_pages_changed({old_names[0], instance.username})
+
+
+def post_scopes(post):
+    scopes = {'index', f'author:{post.author.username}', f'post:{post.pk}'}
+    if post.group_id:
+        scopes.add(f'group:{post.group.slug}')
+    old_group_slug = getattr(post, '_old_group_slug', None)
+    if old_group_slug:
+        scopes.add(f'group:{old_group_slug}')
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # Пост могли перенести в другую группу: старой группе
+    # тоже нужна новая отметка изменения.
+    if instance.pk and not raw:
+        instance._old_group_slug = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group__slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_user_counter(instance.author_id, posts_count=1)
+        fan_out(instance)
+        forget_recent(instance.author_id)
+    bump_feed_generation()
+    touch_scopes(post_scopes(instance), instance.updated)
+    set_post_author(instance.pk, instance.author.username)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_user_counter(instance.author_id, posts_count=-1)
+    forget_recent(instance.author_id)
+    bump_feed_generation()
+    touch_scopes(post_scopes(instance))
+
+
+def comment_scopes(post_id):
+    """
+    Области, которые меняет комментарий: число комментариев поста
+    отдаётся и в списках API ленты, группы и автора.
+    """
+    scopes = {f'post:{post_id}'}
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ).first()
+    if post is not None:
+        username, slug = post
+        scopes.update(['index', f'author:{username}'])
+        if slug:
+            scopes.add(f'group:{slug}')
+    return scopes
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_comments_count(instance.post_id, 1)
+    if not raw:
+        touch_scopes(comment_scopes(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+    touch_scopes(comment_scopes(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        followed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    unfollowed(instance.user_id, [instance.author_id])
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    instance._old_slug = None
+    if instance.pk and not raw:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+def group_authors(group):
+    return list(User.objects.filter(
+        posts__group_id=group.pk
+    ).values_list('username', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления посты уже отвязаны от группы.
+    instance._authors = group_authors(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    forget_group_choices()
+    # Название и описание группы выводятся на её странице и в её RSS,
+    # а адрес группы - в карточках её постов во всех лентах.
+    usernames = getattr(instance, '_authors', None)
+    if usernames is None:
+        usernames = group_authors(instance)
+    bump_feed_generation()
+    touch_scopes(
+        ['index', f'group:{instance.slug}']
+        + [f'author:{username}' for username in usernames]
+    )
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug and old_slug != instance.slug:
+        touch_scopes([f'group:{old_slug}'])
@@ -0,0 +1,141 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from .caching import (FEED_GENERATION_KEY, get_feed_generation,
+                      get_or_build)
+from .conditional import (group_scopes, index_scopes, profile_scopes,
+                          public_condition)
+from .models import Group, Post, User
+
+SYNDICATION_KEY = 'posts:syndication:{}'
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние обновления'
+    description = 'Последние посты на сайте.'
+
+    def link(self, obj=None):
+        return reverse('posts:index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj=None):
+        # Автор и группа приходят тем же запросом, что и посты.
+        return self.posts(obj).for_feed()[:settings.POSTS_SYNDICATION_ITEMS]
+
+    def item_title(self, item):
+        return item.text[:50]
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.updated
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_author_link(self, item):
+        return reverse('posts:profile', args=[item.author.username])
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group_id else []
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_list', args=[obj.slug])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: {obj.get_full_name() or obj.username}'
+
+    def description(self, obj):
+        return f'Посты автора {obj.username}.'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=[obj.username])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return obj.description
+
+
+class AuthorPostsAtomFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+def cached_syndication_view(feed, scopes_func):
+    """
+    View ленты feed: тело ответа хранится в кэше до смены поколения
+    лент, то есть до любой записи поста, а ETag и Last-Modified
+    по отметкам областей позволяют отвечать читателям лент 304
+    без обращения к базе.
+    """
+    @public_condition(scopes_func)
+    def view(request, *args, **kwargs):
+        # Ссылки в ленте абсолютные, поэтому ключ зависит и от хоста.
+        name = ':'.join([
+            request.scheme, request.get_host(), request.path,
+            feed.__class__.__name__
+        ])
+        content = get_or_build(
+            SYNDICATION_KEY.format(hashlib.md5(name.encode()).hexdigest()),
+            lambda: feed(request, *args, **kwargs).content,
+            settings.POSTS_SYNDICATION_CACHE_TIMEOUT,
+            get_feed_generation(),
+            [FEED_GENERATION_KEY]
+        )
+        return HttpResponse(content, content_type=feed.feed_type.content_type)
+    return view
+
+
+index_rss = cached_syndication_view(LatestPostsFeed(), index_scopes)
+index_atom = cached_syndication_view(LatestPostsAtomFeed(), index_scopes)
+group_rss = cached_syndication_view(GroupPostsFeed(), group_scopes)
+group_atom = cached_syndication_view(GroupPostsAtomFeed(), group_scopes)
+profile_rss = cached_syndication_view(AuthorPostsFeed(), profile_scopes)
+profile_atom = cached_syndication_view(AuthorPostsAtomFeed(), profile_scopes)
@@ -0,0 +1,53 @@
+from django import template
+from django.conf import settings
+
+from core.routers import reading_own_writes
+from posts.caching import get_or_build, render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Отрисованные карточки постов страницы из кэша карточек."""
+    return render_cards(posts)
+
+
+class CachedFeedNode(template.Node):
+    def __init__(self, nodelist, key, generation, sources=None):
+        self.nodelist = nodelist
+        self.key = key
+        self.generation = generation
+        self.sources = sources
+
+    def render(self, context):
+        if reading_own_writes():
+            # Фрагмент мог быть собран с реплики до записи автора.
+            return self.nodelist.render(context)
+        return get_or_build(
+            self.key.resolve(context),
+            lambda: self.nodelist.render(context),
+            settings.POSTS_FEED_CACHE_TIMEOUT,
+            self.generation.resolve(context),
+            self.sources.resolve(context) if self.sources else ()
+        )
+
+
+@register.tag
+def cached_feed(parser, token):
+    """
+    {% cached_feed key generation [sources] %}...{% endcached_feed %}
+    Фрагмент ленты через get_or_build: при сбросе поколения его
+    пересобирает один запрос, остальные получают прежний вариант.
+    sources - ключи поколений (см. feed_cache_context).
+    """
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает ключ, поколение и ключи поколений."
+        )
+    nodelist = parser.parse(('endcached_feed',))
+    parser.delete_first_token()
+    return CachedFeedNode(
+        nodelist, *(parser.compile_filter(bit) for bit in bits[1:])
+    )
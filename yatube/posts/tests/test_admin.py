@@ -0,0 +1,140 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post
+from posts.templatetags.post_admin import IndexedDates
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description=''
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(PostAdminTest.admin)
+
+    def create_posts(self, count):
+        Post.objects.bulk_create([
+            Post(
+                text=f'Пост {i}', author=PostAdminTest.admin,
+                group=PostAdminTest.groups[i % 3]
+            )
+            for i in range(count)
+        ])
+
+    def get_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_changelist_queries(self):
+        """
+        Проверим, что число запросов списка постов не растёт
+        с числом строк: автор и группа приходят JOIN, список групп
+        для всех строк берётся из кэша один раз.
+        """
+        url = reverse('admin:posts_post_changelist')
+        self.create_posts(2)
+        self.get_queries(url)
+        _, few = self.get_queries(url)
+        self.create_posts(40)
+        response, many = self.get_queries(url)
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['cl'].result_count, 42)
+        Group.objects.create(title='Новая', slug='new', description='')
+        response, _ = self.get_queries(url)
+        self.assertContains(response, 'Новая')
+
+    def test_estimated_count(self):
+        """
+        Проверим, что без фильтров число постов оценивается
+        по крайним id, а с фильтром по дате считается точно.
+        """
+        self.create_posts(5)
+        Post.objects.filter(text='Пост 2').delete()
+        url = reverse('admin:posts_post_changelist')
+        response, _ = self.get_queries(url)
+        self.assertEqual(response.context['cl'].result_count, 5)
+        post = Post.objects.first()
+        response, _ = self.get_queries(url, {
+            'pub_date__year': post.pub_date.year,
+        })
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+    def test_date_hierarchy(self):
+        """
+        Проверим, что периоды для навигации по датам, найденные
+        поиском по индексу, совпадают с DISTINCT по дате.
+        """
+        self.create_posts(6)
+        start = timezone.make_aware(datetime.datetime(2020, 12, 30, 12))
+        for i, post in enumerate(Post.objects.order_by('pk')):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start + datetime.timedelta(days=20 * i)
+            )
+        posts = Post.objects.all()
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    IndexedDates(posts).dates('pub_date', kind),
+                    list(posts.dates('pub_date', kind))
+                )
+        response, _ = self.get_queries(
+            reverse('admin:posts_post_changelist'),
+            {'pub_date__year': 2021}
+        )
+        self.assertContains(response, 'pub_date__month=1')
+        self.assertContains(response, 'pub_date__month=3')
+
+    def test_autocomplete_widgets(self):
+        """
+        Проверим, что формы комментария и подписки не выводят
+        всех пользователей и все посты в список выбора.
+        """
+        self.create_posts(1)
+        post = Post.objects.get()
+        comment = Comment.objects.create(
+            post=post, author=PostAdminTest.admin, text='Комментарий'
+        )
+        urls = (
+            reverse('admin:posts_comment_change', args=(comment.pk,)),
+            reverse('admin:posts_follow_add'),
+            reverse('admin:posts_post_change', args=(post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'admin-autocomplete')
+        response = self.client.get(urls[0])
+        self.assertRegex(
+            response.content.decode(),
+            r'<select name="parent"[^>]*admin-autocomplete'
+        )
+        response = self.client.get(
+            reverse('admin:posts_comment_autocomplete'), {'term': 'Комм'}
+        )
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [str(comment.pk)]
+        )
@@ -0,0 +1,223 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from posts.timelines import rebuild
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        for i in range(POSTS_PER_PAGE + 3):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author,
+                group=cls.group if i % 2 else None
+            )
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.reader, image='posts/a.gif'
+        )
+        for i in range(COMMENTS_PER_PAGE + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+
+    def get(self, name, params=None, **kwargs):
+        return self.client.get(reverse(f'posts:{name}', kwargs=kwargs),
+                               params or {})
+
+    def walk(self, name, **kwargs):
+        """Все страницы ленты по курсору next."""
+        rows = []
+        cursor = None
+        while True:
+            data = self.get(
+                name, {'cursor': cursor} if cursor else {}, **kwargs
+            ).json()
+            rows.extend(data['results'])
+            cursor = data['next']
+            if cursor is None:
+                return rows
+
+    def test_feeds(self):
+        """
+        Проверим, что ленты листаются курсором без повторов
+        и совпадают с постами в базе.
+        """
+        cases = (
+            ('api_index', {}, Post.objects.all()),
+            ('api_group', {'slug': 'group'},
+             Post.objects.filter(group=ApiTest.group)),
+            ('api_profile', {'username': 'writer'},
+             Post.objects.filter(author=ApiTest.author)),
+        )
+        for name, kwargs, posts in cases:
+            with self.subTest(name=name):
+                rows = self.walk(name, **kwargs)
+                self.assertEqual([row['id'] for row in rows],
+                                 [post.pk for post in posts])
+        data = self.get('api_index').json()
+        self.assertIsNone(data['previous'])
+        back = self.get(
+            'api_index',
+            {'cursor': self.get(
+                'api_index', {'cursor': data['next']}
+            ).json()['previous']}
+        ).json()
+        self.assertEqual(back['results'], data['results'])
+
+    def test_sparse_fields(self):
+        """
+        Проверим, что fields= задаёт поля ответа, без полей связей
+        запрос обходится без JOIN, а неизвестные поля дают 400.
+        """
+        row = self.get('api_index').json()['results'][0]
+        self.assertEqual(
+            set(row), {'id', 'text', 'pub_date', 'author', 'group', 'image'}
+        )
+        self.assertEqual(row['author'], 'reader')
+        self.assertEqual(row['image'], '/media/posts/a.gif')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('api_index', {'fields': 'id,text'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertFalse(any('JOIN' in query['sql']
+                             for query in queries.captured_queries))
+        response = self.get('api_index', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['errors']['fields'][0])
+
+    def test_post_and_comments(self):
+        """
+        Проверим пост и его комментарии от старых к новым,
+        а также 404 для несуществующих объектов.
+        """
+        post_id = ApiTest.post.pk
+        data = self.get(
+            'api_post', {'fields': 'text,comments_count'}, post_id=post_id
+        ).json()
+        self.assertEqual(
+            data, {'text': 'Обсуждаемый пост',
+                   'comments_count': COMMENTS_PER_PAGE + 1}
+        )
+        rows = self.walk('api_comments', post_id=post_id)
+        self.assertEqual(
+            [row['text'] for row in rows],
+            [f'Комментарий {i}' for i in range(COMMENTS_PER_PAGE + 1)]
+        )
+        for name, kwargs in (('api_post', {'post_id': 0}),
+                             ('api_comments', {'post_id': 0}),
+                             ('api_group', {'slug': 'missing'}),
+                             ('api_profile', {'username': 'missing'})):
+            with self.subTest(name=name):
+                response = self.get(name, **kwargs)
+                self.assertEqual(response.status_code, 404)
+                self.assertFalse(response.has_header('ETag'))
+
+    def test_etag(self):
+        """
+        Проверим, что ответ с совпавшим ETag отдаётся как 304
+        без запросов к базе, а новый пост меняет ETag.
+        """
+        response = self.get('api_index')
+        etag = response['ETag']
+        self.assertNotEqual(
+            self.get('api_index', {'fields': 'id'})['ETag'], etag
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:api_index'), HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        Post.objects.create(text='Новый', author=ApiTest.author)
+        response = self.client.get(
+            reverse('posts:api_index'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_follows_comments(self):
+        """
+        Проверим, что новый комментарий меняет ETag списков,
+        в которых отдаётся число комментариев.
+        """
+        params = {'fields': 'id,comments_count'}
+        lists = (
+            ('api_index', {}),
+            ('api_profile', {'username': ApiTest.reader.username}),
+        )
+        etags = {
+            name: self.get(name, params, **kwargs)['ETag']
+            for name, kwargs in lists
+        }
+        Comment.objects.create(
+            post=ApiTest.post, author=ApiTest.author, text='Ещё один'
+        )
+        for name, kwargs in lists:
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse(f'posts:{name}', kwargs=kwargs), params,
+                    HTTP_IF_NONE_MATCH=etags[name]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_follow_feed(self):
+        """
+        Проверим ленту подписок при каждой стратегии,
+        ETag по содержимому и 401 для гостя.
+        """
+        self.assertEqual(self.get('api_follow').status_code, 401)
+        self.client.force_login(ApiTest.reader)
+        expected = list(Post.objects.filter(
+            author=ApiTest.author
+        ).values_list('id', flat=True))
+        for strategy in ('timeline', 'merge', 'hybrid'):
+            with self.subTest(strategy=strategy), \
+                    override_settings(POSTS_FOLLOW_FEED=strategy):
+                cache.clear()
+                rebuild([ApiTest.reader.pk])
+                rows = self.walk('api_follow')
+                self.assertEqual([row['id'] for row in rows], expected)
+        response = self.get('api_follow')
+        response = self.client.get(
+            reverse('posts:api_follow'), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_bench_command(self):
+        """
+        Проверим, что сравнение с HTML выполняется во временной
+        базе и не трогает ни рабочую базу, ни общий кэш.
+        """
+        posts_count = Post.objects.count()
+        cache.set('bench-canary', 1)
+        out = StringIO()
+        call_command(
+            'bench_api', authors=2, posts=3, comments=2, repeat=1,
+            stdout=out
+        )
+        for name in ('index', 'comments', 'follow'):
+            self.assertIn(name, out.getvalue())
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertEqual(cache.get('bench-canary'), 1)
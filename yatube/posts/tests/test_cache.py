@@ -1,9 +1,27 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.db import transaction
+from django.db.models import F
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
 
-from posts.models import Group, Post
+from posts.caching import (bump_feed_generation, card_cache_key,
+                           get_cache_stats, get_feed_generation,
+                           get_or_build, get_scope_stamp, local_cache,
+                           touch_scopes)
+from posts.follows import follow
+from posts.models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -25,30 +43,433 @@ class TestCache(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
+        local_cache.clear()
         self.user_1_client = Client()
         self.user_1_client.force_login(TestCache.user)
 
     def test_cache(self):
         """
-        Проверим, что до очистки кэша контент сохраняется даже
-        после принудительного удаления объекта из базы данных
+        Проверим, что фрагмент ленты берётся из кэша, пока посты
+        не менялись, и сбрасывается при удалении поста.
         """
         response_1 = self.user_1_client.get(
             reverse(
                 'posts:index'
             )
         )
-        TestCache.test_post.delete()
+        Post.objects.filter(pk=TestCache.test_post.pk).update(
+            text='Изменено в обход сигналов'
+        )
         response_2 = self.user_1_client.get(
             reverse(
                 'posts:index'
             )
         )
         self.assertEqual(response_1.content, response_2.content)
-        cache.clear()
+        TestCache.test_post.delete()
         response_3 = self.user_1_client.get(
             reverse(
                 'posts:index'
             )
         )
         self.assertNotEqual(response_1.content, response_3.content)
+
+    def test_cache_per_page(self):
+        """
+        Проверим, что страницы лент кэшируются отдельно и
+        сбрасываются при создании и редактировании поста.
+        """
+        Post.objects.bulk_create([
+            Post(text=f'Пост №{i}', group=TestCache.group,
+                 author=TestCache.user)
+            for i in range(1, 15)
+        ])
+        urls = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': TestCache.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': TestCache.user.username}
+            ),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.user_1_client.get(url)
+                second = self.user_1_client.get(url, {'page': 2})
+                self.assertNotEqual(first.content, second.content)
+                self.assertContains(second, 'Тест №0')
+                post = Post.objects.create(
+                    text=f'Свежий пост для {url}',
+                    group=TestCache.group,
+                    author=TestCache.user
+                )
+                self.assertContains(self.user_1_client.get(url), post.text)
+                post.text = f'Отредактирован для {url}'
+                post.save()
+                self.assertContains(self.user_1_client.get(url), post.text)
+
+    def test_follow_cache_invalidation(self):
+        """
+        Проверим, что лента подписок сбрасывается при подписке.
+        """
+        reader = User.objects.create_user(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        url = reverse('posts:follow_index')
+        self.assertNotContains(reader_client.get(url), 'Тест №0')
+        Follow.objects.create(user=reader, author=TestCache.user)
+        self.assertContains(reader_client.get(url), 'Тест №0')
+
+    def test_card_cache(self):
+        """
+        Проверим, что карточка поста отрисовывается один раз для всех
+        лент и перерисовывается после редактирования поста.
+        """
+        post = Post.objects.get(text='Тест №0')
+        self.user_1_client.get(reverse('posts:index'))
+        self.assertIsNotNone(cache.get(card_cache_key(post)))
+        Post.objects.filter(pk=post.pk).update(
+            text='Изменено в обход сигналов'
+        )
+        group_url = reverse(
+            'posts:group_list',
+            kwargs={'slug': TestCache.group.slug}
+        )
+        response = self.user_1_client.get(group_url)
+        self.assertContains(response, 'Тест №0')
+        post.text = 'Отредактированный пост'
+        post.save()
+        response = self.user_1_client.get(group_url)
+        self.assertContains(response, 'Отредактированный пост')
+
+    def test_cards_follow_author_and_group(self):
+        """
+        Проверим, что карточки и страницы для гостей обновляются
+        после смены имени автора и адреса группы.
+        """
+        guest_client = Client()
+        url = reverse('posts:index')
+        etag = guest_client.get(url)['ETag']
+        TestCache.user.first_name = 'Фёдор'
+        TestCache.user.last_name = 'Достоевский'
+        TestCache.user.save()
+        response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Фёдор Достоевский')
+        group = Group.objects.get(pk=TestCache.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        response = guest_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/group/renamed/')
+        self.assertNotContains(response, '/group/TestGroup1/')
+
+
+class TestConditionalGet(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='TestGroup1',
+            slug='TestGroup1',
+            description='TestGroup1'
+        )
+        cls.post = Post.objects.create(
+            text='Тест №0',
+            group=cls.group,
+            author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.guest_client = Client()
+
+    def assertNotModified(self, url):
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        repeated = self.guest_client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(repeated.status_code, 304)
+        return response['ETag']
+
+    def test_not_modified_until_write(self):
+        """
+        Проверим, что гость получает 304, пока в области страницы
+        ничего не менялось, и 200 после записи.
+        """
+        post_url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': TestConditionalGet.post.id}
+        )
+        urls = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': TestConditionalGet.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': TestConditionalGet.user.username}
+            ),
+            post_url,
+        ]
+        etags = {url: self.assertNotModified(url) for url in urls}
+        Post.objects.create(
+            text='Новый пост',
+            group=TestConditionalGet.group,
+            author=TestConditionalGet.user
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        etag = self.assertNotModified(post_url)
+        Comment.objects.create(
+            text='Комментарий',
+            author=TestConditionalGet.user,
+            post=TestConditionalGet.post
+        )
+        response = self.guest_client.get(post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_until_follow(self):
+        """
+        Проверим, что подписка меняет ETag страниц профиля
+        автора и подписчика: на них выводятся их счётчики.
+        """
+        reader = User.objects.create_user(username='reader')
+        urls = [
+            reverse('posts:profile', args=[username])
+            for username in (TestConditionalGet.user.username, 'reader')
+        ]
+        etags = {url: self.assertNotModified(url) for url in urls}
+        follow(reader.pk, [TestConditionalGet.user.pk])
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            self.guest_client.get(urls[0]), 'Подписчиков: 1'
+        )
+
+    def test_no_validators_for_users(self):
+        """
+        Проверим, что авторизованным пользователям валидаторы
+        не отдаются.
+        """
+        client = Client()
+        client.force_login(TestConditionalGet.user)
+        response = client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_scope_keys_valid_for_memcached(self):
+        """
+        Проверим, что области с пробелами и кириллицей дают
+        допустимые для memcached ключи.
+        """
+        scope = 'author:автор с пробелом'
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            touch_scopes([scope])
+            self.assertIsNotNone(get_scope_stamp(scope))
+        for key in cache._cache:
+            with self.subTest(key=key):
+                self.assertTrue(key.isascii())
+                self.assertNotIn(' ', key)
+
+
+def bump_in_other_worker():
+    """То, что сигналы поста делают в другом воркере."""
+    bump_feed_generation()
+    touch_scopes(['index'])
+
+
+class TestSharedCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.shared_cache = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': os.path.join(cls.cache_dir, 'cache.sqlite3'),
+            }
+        })
+        cls.shared_cache.enable()
+        cls.user = User.objects.create_user(username='test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.shared_cache.disable()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def run_in_other_process(self, target):
+        process = multiprocessing.get_context('fork').Process(target=target)
+        process.start()
+        process.join(30)
+        self.assertEqual(process.exitcode, 0)
+
+    def test_cross_process_invalidation(self):
+        """
+        Проверим, что сброс поколения в другом процессе
+        виден этому процессу и обновляет ленту и валидаторы.
+        """
+        guest_client = Client()
+        url = reverse('posts:index')
+        generation = get_feed_generation()
+        first = guest_client.get(url)
+        Post.objects.bulk_create([
+            Post(text='Пост из другого воркера', author=TestSharedCache.user)
+        ])
+        self.assertNotContains(guest_client.get(url), 'другого воркера')
+        self.run_in_other_process(bump_in_other_worker)
+        self.assertEqual(get_feed_generation(), generation + 1)
+        response = guest_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Пост из другого воркера')
+
+
+class TestGetOrBuild(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def test_single_build_for_concurrent_requests(self):
+        """
+        Проверим, что при одновременных промахах значение
+        строится один раз, а остальные запросы его дожидаются.
+        """
+        requests_count = 8
+        builds = []
+        barrier = threading.Barrier(requests_count)
+        results = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return 'страница'
+
+        def request():
+            barrier.wait()
+            results.append(get_or_build('posts:test', build, 60, 1))
+
+        threads = [
+            threading.Thread(target=request) for _ in range(requests_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ['страница'] * requests_count)
+
+    def test_stale_value_while_rebuilding(self):
+        """
+        Проверим, что пока другой процесс пересобирает значение,
+        отдаётся прежнее, а не строится ещё одно.
+        """
+        get_or_build('posts:test', lambda: 'старая', 60, 1)
+        cache.add('posts:test:lock', 1)
+
+        def build():
+            raise AssertionError('Значение строится повторно')
+
+        self.assertEqual(get_or_build('posts:test', build, 60, 2), 'старая')
+        cache.delete('posts:test:lock')
+        self.assertEqual(
+            get_or_build('posts:test', lambda: 'новая', 60, 2), 'новая'
+        )
+
+
+class TestLocalCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        cls.post = Post.objects.create(text='Тест №0', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.guest_client = Client()
+
+    def test_local_tier_serves_hot_keys(self):
+        """
+        Проверим, что повторный запрос обслуживается из памяти
+        процесса, а запись поста делает эти записи устаревшими.
+        """
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        before = get_cache_stats()
+        self.guest_client.get(url)
+        after = get_cache_stats()
+        self.assertGreater(
+            after['local']['hits'], before['local']['hits']
+        )
+        self.assertEqual(
+            after['shared']['hits'] + after['shared']['misses'],
+            before['shared']['hits'] + before['shared']['misses']
+        )
+        Post.objects.create(text='Свежий пост', author=TestLocalCache.user)
+        self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_cache_stats_view(self):
+        """Проверим, что счётчики доступны только персоналу."""
+        url = reverse('posts:cache_stats')
+        self.assertEqual(self.guest_client.get(url).status_code, 302)
+        admin_client = Client()
+        admin_client.force_login(TestLocalCache.admin)
+        response = admin_client.get(url)
+        self.assertEqual(set(response.json()), {'local', 'shared'})
+
+
+class TestInvalidationOnCommit(TransactionTestCase):
+    """
+    Запись поста идёт в транзакции, а параллельный читатель
+    до её фиксации видит старый снимок базы. Здесь такой
+    читатель изображается запросом внутри транзакции, после
+    которого пост меняется без сигналов.
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username='test_author')
+        self.guest_client = Client()
+
+    def test_feed_generation(self):
+        """
+        Проверим, что фрагмент ленты, собранный до фиксации,
+        не переживает её.
+        """
+        url = reverse('posts:index')
+        with transaction.atomic():
+            post = Post.objects.create(text='Черновик', author=self.user)
+            self.assertContains(self.guest_client.get(url), 'Черновик')
+            Post.objects.filter(pk=post.pk).update(
+                text='Итог', updated=F('updated') + timedelta(seconds=1)
+            )
+        self.assertContains(self.guest_client.get(url), 'Итог')
+
+    def test_scope_stamps(self):
+        """
+        Проверим, что ETag, выданный до фиксации записи,
+        после неё уже не совпадает.
+        """
+        url = reverse('posts:index')
+        with transaction.atomic():
+            Post.objects.create(text='Черновик', author=self.user)
+            etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
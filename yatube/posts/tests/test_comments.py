@@ -0,0 +1,242 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.models import COMMENT_PATH_WIDTH, Comment, Post
+from posts.paginators import COMMENTS_PER_PAGE
+
+User = get_user_model()
+
+
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='Вирусный пост', author=cls.author)
+        cls.quiet = Post.objects.create(text='Тихий пост', author=cls.author)
+        cls.total = COMMENTS_PER_PAGE * 2 + 5
+        for i in range(cls.total):
+            commenter = User.objects.create_user(username=f'reader{i}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {i}'
+            )
+        Comment.objects.create(
+            post=cls.quiet, author=cls.author, text='Единственный'
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+
+    def detail(self, post, **params):
+        return self.client.get(
+            reverse('posts:post_detail', args=[post.pk]), params
+        )
+
+    def fragment(self, post, **params):
+        return self.client.get(
+            reverse('posts:comments', args=[post.pk]), params
+        )
+
+    def test_first_page(self):
+        """
+        Проверим, что пост выводит первую страницу комментариев
+        от старых к новым, а число запросов не растёт с их числом.
+        """
+        with CaptureQueriesContext(connection) as quiet:
+            self.detail(CommentPagesTest.quiet)
+        with CaptureQueriesContext(connection) as busy:
+            response = self.detail(CommentPagesTest.post)
+        self.assertEqual(len(busy), len(quiet))
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {i}' for i in range(COMMENTS_PER_PAGE)]
+        )
+        self.assertContains(response, 'Показать ещё комментарии')
+        self.assertNotContains(self.detail(CommentPagesTest.quiet),
+                               'Показать ещё комментарии')
+
+    def test_load_more(self):
+        """
+        Проверим, что фрагмент по курсору отдаёт следующую
+        страницу без повторов, а на последней нет кнопки.
+        """
+        cursor = self.detail(CommentPagesTest.post).context[
+            'comments'
+        ].next_cursor
+        texts = []
+        while cursor:
+            response = self.fragment(CommentPagesTest.post, cursor=cursor)
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            self.assertNotContains(response, '<html')
+            comments = response.context['comments']
+            texts.extend(comment.text for comment in comments)
+            cursor = comments.next_cursor
+        self.assertEqual(texts, [
+            f'Комментарий {i}'
+            for i in range(COMMENTS_PER_PAGE, CommentPagesTest.total)
+        ])
+        self.assertNotContains(response, 'Показать ещё комментарии')
+        page = self.detail(
+            CommentPagesTest.post,
+            cursor=self.detail(CommentPagesTest.post).context[
+                'comments'
+            ].next_cursor
+        ).context['comments']
+        self.assertEqual(page[0].text, f'Комментарий {COMMENTS_PER_PAGE}')
+        self.assertEqual(self.client.get(
+            reverse('posts:comments', args=[0])
+        ).status_code, 404)
+
+
+class CommentThreadsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='Спорный пост', author=cls.author)
+        cls.other = Post.objects.create(text='Другой пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+        self.client.force_login(CommentThreadsTest.author)
+
+    def comment(self, text, parent=None, post=None):
+        return Comment.objects.create(
+            post=post or CommentThreadsTest.post,
+            author=CommentThreadsTest.author, text=text, parent=parent
+        )
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def test_thread_order(self):
+        """
+        Проверим, что ответы выводятся сразу за родителем
+        в порядке ветки, а не по времени создания.
+        """
+        first = self.comment('1')
+        second = self.comment('2')
+        answer = self.comment('1.1', first)
+        self.comment('2.1', second)
+        self.comment('1.1.1', answer)
+        self.comment('1.2', first)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[CommentThreadsTest.post.pk])
+        )
+        self.assertEqual(
+            self.texts(response), ['1', '1.1', '1.1.1', '1.2', '2', '2.1']
+        )
+        self.assertEqual(
+            [comment.depth for comment in response.context['comments']],
+            [0, 1, 2, 1, 0, 1]
+        )
+
+    @override_settings(POSTS_COMMENT_MAX_DEPTH=2)
+    def test_max_depth(self):
+        """
+        Проверим, что ответ глубже POSTS_COMMENT_MAX_DEPTH
+        встаёт рядом с родителем.
+        """
+        root = self.comment('корень')
+        answer = self.comment('ответ', root)
+        deep = self.comment('глубже', answer)
+        deepest = self.comment('ещё глубже', deep)
+        self.assertEqual(deep.depth, 2)
+        self.assertEqual(deepest.depth, 2)
+        self.assertEqual(deepest.parent, answer)
+        self.assertEqual(deepest.path[:-COMMENT_PATH_WIDTH], answer.path)
+
+    def test_pages_of_threads(self):
+        """
+        Проверим, что курсор листает корни веток, ответы приходят
+        вместе с ними, а число запросов не зависит от их числа.
+        """
+        for i in range(COMMENTS_PER_PAGE + 1):
+            root = self.comment(f'Ветка {i}')
+            self.comment(f'Ответ {i}', self.comment(f'Ответ {i}', root))
+        self.comment('Одна', post=CommentThreadsTest.other)
+        url = reverse('posts:comments', args=[CommentThreadsTest.post.pk])
+        with CaptureQueriesContext(connection) as quiet:
+            self.client.get(
+                reverse('posts:comments', args=[CommentThreadsTest.other.pk])
+            )
+        with CaptureQueriesContext(connection) as busy:
+            response = self.client.get(url)
+        self.assertEqual(len(self.texts(response)), COMMENTS_PER_PAGE * 3)
+        self.assertEqual(len(busy), len(quiet))
+        response = self.client.get(
+            url, {'cursor': response.context['comments'].next_cursor}
+        )
+        self.assertEqual(self.texts(response), [
+            f'Ветка {COMMENTS_PER_PAGE}',
+            f'Ответ {COMMENTS_PER_PAGE}', f'Ответ {COMMENTS_PER_PAGE}'
+        ])
+
+    @override_settings(POSTS_COMMENT_REPLIES_PER_THREAD=2)
+    def test_replies_per_thread(self):
+        """
+        Проверим, что ветка выводится не больше чем с
+        POSTS_COMMENT_REPLIES_PER_THREAD ответами, а остальные
+        подгружаются по ссылке «Показать ещё ответы».
+        """
+        busy = self.comment('большая')
+        answer = self.comment('1', busy)
+        self.comment('1.1', answer)
+        self.comment('2', busy)
+        self.comment('3', busy)
+        small = self.comment('малая')
+        self.comment('ответ', small)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[CommentThreadsTest.post.pk])
+        )
+        self.assertEqual(
+            self.texts(response), ['большая', '1', '1.1', 'малая', 'ответ']
+        )
+        self.assertContains(response, 'Показать ещё ответы', count=1)
+        url = reverse(
+            'posts:comment_replies',
+            args=[CommentThreadsTest.post.pk, busy.pk]
+        )
+        last = response.context['comments'][2]
+        self.assertEqual(last.more_replies, busy.pk)
+        response = self.client.get(url, {'cursor': last.path})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(self.texts(response), ['2', '3'])
+        self.assertNotContains(response, 'Показать ещё ответы')
+        self.assertEqual(
+            self.texts(self.client.get(url, {'cursor': 'мусор'})),
+            ['1', '1.1']
+        )
+
+    def test_reply(self):
+        """
+        Проверим ответ через форму: он привязывается к родителю,
+        а родитель из другого поста отклоняется.
+        """
+        root = self.comment('корень')
+        stranger = self.comment('чужой', post=CommentThreadsTest.other)
+        url = reverse('posts:add_comment', args=[CommentThreadsTest.post.pk])
+        self.client.post(url, {'text': 'ответ', 'parent': root.pk})
+        reply = Comment.objects.get(text='ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.depth, 1)
+        self.client.post(url, {'text': 'подмена', 'parent': stranger.pk})
+        self.assertFalse(Comment.objects.filter(text='подмена').exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=[CommentThreadsTest.post.pk]),
+            {'reply_to': root.pk}
+        )
+        self.assertContains(
+            response, f'name="parent" value="{root.pk}"'
+        )
+        self.assertContains(response, f'data-reply="{root.pk}"')
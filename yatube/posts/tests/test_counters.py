@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, UserCounter
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+
+    def get_counter(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """
+        Проверим, что счётчики меняются при создании
+        и удалении постов, комментариев и подписок.
+        """
+        post = Post.objects.create(text='Тест', author=CountersTest.author)
+        comment = Comment.objects.create(
+            text='Комментарий',
+            author=CountersTest.user,
+            post=post
+        )
+        follow = Follow.objects.create(
+            user=CountersTest.user,
+            author=CountersTest.author
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.get_counter(CountersTest.author).posts_count, 1)
+        self.assertEqual(
+            self.get_counter(CountersTest.author).followers_count, 1
+        )
+        self.assertEqual(
+            self.get_counter(CountersTest.user).following_count, 1
+        )
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            self.get_counter(CountersTest.author).followers_count, 0
+        )
+        self.assertEqual(
+            self.get_counter(CountersTest.user).following_count, 0
+        )
+        post.delete()
+        self.assertEqual(self.get_counter(CountersTest.author).posts_count, 0)
+
+    def test_delete_user_with_content(self):
+        """
+        Проверим, что пользователя с постами, комментариями
+        и подписками можно удалить из админки, а счётчики
+        остальных пользователей уменьшаются.
+        """
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        leaving = User.objects.create_user(username='leaving')
+        post = Post.objects.create(text='Пост', author=leaving)
+        Comment.objects.create(text='Свой', author=leaving, post=post)
+        Comment.objects.create(
+            text='Чужой', author=CountersTest.user, post=post
+        )
+        Follow.objects.create(user=leaving, author=CountersTest.author)
+        Follow.objects.create(user=CountersTest.user, author=leaving)
+        client = Client()
+        client.force_login(admin)
+        response = client.post(reverse('admin:auth_user_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [leaving.pk],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        connection.check_constraints()
+        self.assertFalse(User.objects.filter(username='leaving').exists())
+        self.assertFalse(
+            UserCounter.objects.filter(user_id=leaving.pk).exists()
+        )
+        self.assertEqual(
+            self.get_counter(CountersTest.author).followers_count, 0
+        )
+        self.assertEqual(
+            self.get_counter(CountersTest.user).following_count, 0
+        )
+
+    def test_recount_command(self):
+        """
+        Проверим, что команда recount_counters чинит счётчики
+        после массовой вставки в обход сигналов.
+        """
+        Post.objects.bulk_create([
+            Post(text=f'Тест №{i}', author=CountersTest.author)
+            for i in range(5)
+        ])
+        UserCounter.objects.filter(user=CountersTest.user).delete()
+        self.assertEqual(self.get_counter(CountersTest.author).posts_count, 0)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.get_counter(CountersTest.author).posts_count, 5)
+        self.assertTrue(
+            UserCounter.objects.filter(user=CountersTest.user).exists()
+        )
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_EXPORT_CHUNK_SIZE=3,
+    POSTS_EXPORT_BUFFER_SIZE=100
+)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Выгрузка', slug='export', description=''
+        )
+        for i in range(7):
+            Post.objects.create(
+                text=f'Пост, "с кавычками" №{i}', author=cls.author,
+                group=cls.group if i % 2 else None
+            )
+        Post.objects.create(
+            text='Чужой пост', author=cls.other, group=cls.group
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ExportTest.other)
+
+    def export(self, name, fmt, **kwargs):
+        response = self.client.get(
+            reverse(f'posts:{name}_export', kwargs=kwargs), {'format': fmt}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_profile_jsonl(self):
+        """
+        Проверим, что посты автора выгружаются построчно от старых
+        к новым с именем автора и slug группы.
+        """
+        content = self.export('profile', 'jsonl', username='writer')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        posts = Post.objects.filter(
+            author=ExportTest.author
+        ).order_by('pub_date', 'id')
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in posts])
+        self.assertEqual(rows[0]['author'], 'writer')
+        self.assertIsNone(rows[0]['group'])
+        self.assertEqual(rows[1]['group'], 'export')
+        self.assertEqual(rows[0]['text'], posts[0].text)
+
+    def test_group_csv(self):
+        """Проверим выгрузку группы в CSV с заголовком."""
+        content = self.export('group', 'csv', slug='export')
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1]['author'], 'other')
+        self.assertEqual(rows[0]['text'], 'Пост, "с кавычками" №1')
+
+    def test_zip_with_media(self):
+        """
+        Проверим, что архив содержит посты и их картинки,
+        а пропавший файл не ломает выгрузку.
+        """
+        post = Post.objects.create(
+            text='С картинкой', author=ExportTest.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+        Post.objects.create(
+            text='Без файла', author=ExportTest.author, image='posts/lost.gif'
+        )
+        content = self.export('profile', 'zip', username='writer')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(
+                archive.namelist(), ['posts.jsonl', f'media/{post.image}']
+            )
+            self.assertEqual(archive.read(f'media/{post.image}'), SMALL_GIF)
+            self.assertEqual(
+                len(archive.read('posts.jsonl').splitlines()), 9
+            )
+
+    def test_access_and_format(self):
+        """Проверим вход по логину, неизвестный формат и 404."""
+        url = reverse('posts:group_export', kwargs={'slug': 'export'})
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code,
+                         400)
+        missing = reverse('posts:group_export', kwargs={'slug': 'missing'})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+        response = Client().get(url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_command(self):
+        """Проверим команду выгрузки в файл и в stdout."""
+        out = StringIO()
+        call_command('export_content', '--group=export', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        path = os.path.join(TEMP_MEDIA_ROOT, 'writer.csv')
+        call_command(
+            'export_content', '--author=writer', format='csv', output=path,
+            stderr=StringIO()
+        )
+        with open(path, encoding='utf-8', newline='') as file:
+            self.assertEqual(len(list(csv.DictReader(file))), 7)
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.follow_graph import (following_among, get_followers_counts,
+                                get_following_ids, is_following)
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'writer{i}') for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+        self.client.force_login(FollowGraphTest.user)
+
+    def test_graph_follows_writes(self):
+        """
+        Проверим, что подписки и число подписчиков берутся из кэша
+        и обновляются при подписке и отписке.
+        """
+        user = FollowGraphTest.user
+        first, second, third = FollowGraphTest.authors
+        self.assertEqual(get_following_ids(user.pk), set())
+        follow = Follow.objects.create(user=user, author=first)
+        Follow.objects.create(user=user, author=second)
+        self.assertEqual(get_following_ids(user.pk), {first.pk, second.pk})
+        self.assertEqual(
+            get_followers_counts([first.pk, third.pk]),
+            {first.pk: 1, third.pk: 0}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                following_among(user.pk, [a.pk for a in (first, third)]),
+                {first.pk}
+            )
+            self.assertTrue(is_following(user.pk, second.pk))
+            self.assertEqual(get_followers_counts([first.pk])[first.pk], 1)
+        follow.delete()
+        self.assertFalse(is_following(user.pk, first.pk))
+        self.assertEqual(get_followers_counts([first.pk])[first.pk], 0)
+
+    def test_fallback_on_cache_loss(self):
+        """Проверим, что после потери кэша подписки читаются из базы."""
+        user = FollowGraphTest.user
+        author = FollowGraphTest.authors[0]
+        Follow.objects.create(user=user, author=author)
+        self.assertTrue(is_following(user.pk, author.pk))
+        cache.clear()
+        self.assertTrue(is_following(user.pk, author.pk))
+
+    def test_profile_follow_flag(self):
+        """
+        Проверим, что страница профиля показывает подписку
+        сразу после подписки и отписки через views.
+        """
+        author = FollowGraphTest.authors[0]
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        self.assertFalse(self.client.get(url).context['following'])
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': author})
+        )
+        self.assertTrue(self.client.get(url).context['following'])
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': author})
+        )
+        self.assertFalse(self.client.get(url).context['following'])
@@ -0,0 +1,146 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.follows import follow
+from posts.models import Follow, UserCounter
+
+User = get_user_model()
+
+
+class FollowsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'writer{i}') for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+        self.client.force_login(FollowsTest.user)
+
+    def test_follow_statements(self):
+        """
+        Проверим, что повторная подписка не меняет ни подписок,
+        ни счётчиков и обходится поиском автора и одним INSERT.
+        """
+        author = FollowsTest.authors[0]
+        url = reverse('posts:profile_follow', kwargs={'username': author})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        statements = [
+            query['sql'] for query in queries.captured_queries
+            if 'SAVEPOINT' not in query['sql']
+        ]
+        # Сессия, пользователь, поиск автора и один INSERT ... OR IGNORE.
+        self.assertEqual(len(statements), 4, statements)
+        self.assertIn('INSERT', statements[-1])
+        self.assertRedirects(
+            response,
+            reverse('posts:profile', kwargs={'username': author}),
+            fetch_redirect_response=False
+        )
+        self.assertEqual(
+            Follow.objects.filter(user=FollowsTest.user).count(), 1
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=author).followers_count, 1
+        )
+        missing = reverse(
+            'posts:profile_follow', kwargs={'username': 'nobody'}
+        )
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_bulk_follow(self):
+        """
+        Проверим, что подписка списком подписывает на существующих
+        авторов, пропускает себя и сообщает о ненайденных.
+        """
+        url = reverse('posts:follow_bulk')
+        names = ' '.join(author.username for author in FollowsTest.authors)
+        response = self.client.post(url, {
+            'usernames': f'{names}, reader\nnobody',
+            'action': 'follow',
+        })
+        self.assertEqual(
+            response.json(), {'changed': 3, 'missing': ['nobody']}
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=FollowsTest.user).following_count, 3
+        )
+        response = self.client.post(url, {
+            'usernames': FollowsTest.authors[0].username,
+            'action': 'unfollow',
+        })
+        self.assertEqual(response.json()['changed'], 1)
+        self.assertEqual(
+            Follow.objects.filter(user=FollowsTest.user).count(), 2
+        )
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(
+            self.client.post(url, {'action': 'follow'}).status_code, 400
+        )
+
+
+class ConcurrentFollowTest(TransactionTestCase):
+    def test_concurrent_follow_same_pair(self):
+        """
+        Проверим, что одновременные подписки на одного автора
+        создают одну подписку и сдвигают счётчики один раз.
+        """
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='writer')
+        threads_count = 8
+        barrier = threading.Barrier(threads_count)
+        results = []
+        errors = []
+
+        def hammer():
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        results.append(follow(user.pk, [author.pk]))
+                        break
+                    except OperationalError as error:
+                        # Тестовая база SQLite в памяти блокирует таблицы
+                        # без ожидания (busy_timeout на неё не действует):
+                        # повторяем, как повторил бы клиент.
+                        if 'locked' not in str(error):
+                            raise
+                        time.sleep(0.01)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=hammer) for _ in range(threads_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(results.count([author.pk]), 1)
+        self.assertEqual(
+            Follow.objects.filter(user=user, author=author).count(), 1
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=author).followers_count, 1
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=user).following_count, 1
+        )
@@ -0,0 +1,206 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          comment_path_segment)
+from posts.search import matching
+
+User = get_user_model()
+
+
+@override_settings(POSTS_FOLLOW_FEED='timeline')
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Импорт', slug='import', description=''
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def write_posts(self, count):
+        return self.write('posts.jsonl', '\n'.join(
+            json.dumps({
+                'author': 'writer' if i % 5 else 'nobody',
+                'text': f'Импортированный пост {i}',
+                'group': 'import' if i % 2 else None,
+                'pub_date': f'2020-01-01T10:{i // 60:02d}:{i % 60:02d}',
+            }, ensure_ascii=False)
+            for i in range(count)
+        ))
+
+    def call(self, *args, **options):
+        out = StringIO()
+        call_command('import_content', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def get_index_names(self):
+        with connection.cursor() as cursor:
+            return {
+                index for index, info in connection.introspection
+                .get_constraints(cursor, Post._meta.db_table).items()
+                if info['index']
+            }
+
+    def test_import_posts(self):
+        """
+        Проверим, что посты загружаются пачками с датами из файла,
+        строки с неизвестным автором пропускаются, а счётчики,
+        поиск и ленты подписчиков обновляются.
+        """
+        out = self.call(
+            'posts', self.write_posts(25), batch_size=4, chunk_size=10
+        )
+        self.assertIn('Загружено 20, пропущено 5', out)
+        self.assertIn('строк/с', out)
+        self.assertIn('пик памяти', out)
+        posts = Post.objects.filter(author=ImportContentTest.author)
+        self.assertEqual(posts.count(), 20)
+        self.assertEqual(posts.filter(group__slug='import').count(), 10)
+        self.assertFalse(posts.exclude(pub_date__year=2020).exists())
+        self.assertEqual(
+            ImportContentTest.author.counter.__class__.objects.get(
+                user=ImportContentTest.author
+            ).posts_count,
+            20
+        )
+        self.assertEqual(matching(posts, 'импортированный').count(), 20)
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=ImportContentTest.reader
+            ).count(),
+            20
+        )
+
+    def test_deferred_maintenance(self):
+        """
+        Проверим, что с --defer индексы и триггеры поиска
+        возвращаются, а счётчики и поиск строятся в конце.
+        """
+        indexes = self.get_index_names()
+        self.call('posts', self.write_posts(10), defer=True)
+        self.assertEqual(self.get_index_names(), indexes)
+        self.assertEqual(
+            matching(Post.objects.all(), 'импортированный').count(), 8
+        )
+        self.assertEqual(
+            User.objects.get(username='writer').counter.posts_count, 8
+        )
+        post = Post.objects.create(
+            text='Новый пост после импорта', author=ImportContentTest.author
+        )
+        self.assertEqual(list(matching(Post.objects.all(), 'после')), [post])
+
+    def test_import_comments_and_follows(self):
+        """
+        Проверим загрузку комментариев и подписок из CSV:
+        повторы, подписки на себя и ссылки на неизвестные
+        посты пропускаются, счётчики сходятся, а комментарии
+        получают пути корней веток.
+        """
+        post = Post.objects.create(
+            text='Пост', author=ImportContentTest.author
+        )
+        path = self.write('comments.csv', (
+            'post,author,text,created\n'
+            f'{post.pk},reader,Первый,2020-01-01T10:00:00\n'
+            f'{post.pk},writer,Второй,\n'
+            f'{post.pk + 1000},reader,Мимо,\n'
+        ))
+        self.assertIn('Загружено 2, пропущено 1', self.call('comments', path))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(Comment.objects.filter(post=post).count(), 2)
+        for comment in Comment.objects.filter(post=post):
+            self.assertEqual(comment.path, comment_path_segment(comment.pk))
+        path = self.write('follows.csv', (
+            'user,author\n'
+            'writer,reader\n'
+            'writer,reader\n'
+            'writer,writer\n'
+            'reader,writer\n'
+        ))
+        self.assertIn('Загружено 1, пропущено 3', self.call('follows', path))
+        reader = User.objects.get(username='reader')
+        self.assertEqual(reader.counter.followers_count, 1)
+        self.assertEqual(reader.counter.following_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user__username='writer').count(), 0
+        )
+
+    def test_bad_input(self):
+        """Проверим, что неверная строка останавливает импорт."""
+        path = self.write('broken.jsonl', '{"author": "writer"\n')
+        with self.assertRaises(CommandError):
+            self.call('posts', path)
+        path = self.write('missing.jsonl', '{"author": "writer"}\n')
+        with self.assertRaises(CommandError):
+            self.call('posts', path)
+
+    def test_bad_input_line_numbers(self):
+        """
+        Проверим, что повтор id, неверный id поста и нарушение
+        ограничений базы сообщают номер строки.
+        """
+        post = Post.objects.create(text='Пост', author=self.author)
+        rows = {
+            'duplicate.jsonl': [
+                {'author': 'writer', 'text': 'Первый', 'id': 1000},
+                {'author': 'writer', 'text': 'Второй', 'id': 1000},
+            ],
+            'existing.jsonl': [
+                {'author': 'writer', 'text': 'Новый', 'id': post.pk},
+            ],
+            'null.jsonl': [
+                {'author': 'writer', 'text': 'Пост'},
+                {'author': 'writer', 'text': None},
+            ],
+        }
+        messages = {
+            'duplicate.jsonl': 'Строка 2: id 1000 уже был в строке 1',
+            'existing.jsonl': f'Строка 1: пост с id {post.pk} уже есть',
+            'null.jsonl': 'Строки 1-2:',
+        }
+        for name, message in messages.items():
+            with self.subTest(name=name):
+                path = self.write(name, '\n'.join(
+                    json.dumps(row, ensure_ascii=False) for row in rows[name]
+                ))
+                with self.assertRaisesMessage(CommandError, message):
+                    self.call('posts', path)
+        path = self.write('comments.csv', (
+            'post,author,text,created\n'
+            f'{post.pk},writer,Комментарий,\n'
+            'первый,writer,Комментарий,\n'
+        ))
+        with self.assertRaisesMessage(
+            CommandError, 'Строка 3: неверный post первый'
+        ):
+            self.call('comments', path)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Тестовое описание'
+        )
+        Post.objects.bulk_create([
+            Post(
+                text=f'Тест №{i}',
+                author=cls.author,
+                group=cls.group if i % 2 else None
+            ) for i in range(30)
+        ])
+        cls.post = Post.objects.create(text='Тест', author=cls.author)
+        Comment.objects.bulk_create([
+            Comment(text=f'Комментарий №{i}', author=cls.user, post=cls.post)
+            for i in range(5)
+        ])
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(FeedIndexesTest.user)
+
+    def get_plan(self, url, table):
+        """План запроса страницы, читающего table с сортировкой."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        sql = next(
+            query['sql'] for query in queries.captured_queries
+            if f'FROM "{table}"' in query['sql']
+            and 'ORDER BY' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    @override_settings(POSTS_FOLLOW_FEED='timeline')
+    def test_feeds_use_index_without_sort(self):
+        """
+        Проверим, что ленты и список комментариев читаются
+        по индексу без временного B-дерева для сортировки.
+        """
+        pages = {
+            reverse('posts:index'): 'posts_post',
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': FeedIndexesTest.group.slug}
+            ): 'posts_post',
+            reverse(
+                'posts:profile',
+                kwargs={'username': FeedIndexesTest.author.username}
+            ): 'posts_post',
+            reverse('posts:follow_index'): 'posts_post',
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': FeedIndexesTest.post.id}
+            ): 'posts_comment',
+        }
+        for url, table in pages.items():
+            with self.subTest(url=url):
+                plan = self.get_plan(url, table)
+                self.assertFalse(
+                    any('TEMP B-TREE' in step for step in plan), plan
+                )
+                self.assertTrue(
+                    any('USING' in step and 'INDEX' in step
+                        for step in plan), plan
+                )
@@ -0,0 +1,134 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.models import Group, Post
+from posts.search import FTS_TABLE, drop_triggers, matching
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Кошки', slug='cats', description='Про кошек'
+        )
+        Post.objects.bulk_create([
+            Post(text=f'Ёжик и кот №{i}', author=cls.author)
+            for i in range(12)
+        ])
+        cls.best = Post.objects.create(
+            text='Кот, кот и ещё раз кот', author=cls.other,
+            group=cls.group
+        )
+        Post.objects.create(text='Про собак', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+
+    def search(self, **params):
+        return self.client.get(reverse('posts:search'), params)
+
+    def test_ranked_cursor_pages(self):
+        """
+        Проверим, что лучшее совпадение идёт первым, а выдача
+        листается курсором без повторов и пропусков.
+        """
+        response = self.search(q='кот')
+        page = response.context['page_obj']
+        self.assertEqual(page[0], SearchTest.best)
+        self.assertTrue(page.has_next())
+        self.assertIn('q=', response.context['query_prefix'])
+        second = self.search(q='кот', cursor=page.next_cursor)
+        second_page = second.context['page_obj']
+        self.assertFalse(second_page.has_next())
+        found = [post.pk for post in page] + [post.pk for post in second_page]
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(len(found), 13)
+        back = self.search(q='кот', cursor=second_page.previous_cursor)
+        self.assertEqual(list(back.context['page_obj']), list(page))
+
+    def test_filters_and_syntax(self):
+        """
+        Проверим фильтры по группе и автору, поиск по префиксу
+        без учёта регистра и устойчивость к операторам FTS5.
+        """
+        page = self.search(q='кот', group='cats').context['page_obj']
+        self.assertEqual(list(page), [SearchTest.best])
+        page = self.search(q='кот', author='writer').context['page_obj']
+        self.assertEqual(len(page), 10)
+        self.assertNotIn(SearchTest.best, page)
+        page = self.search(q='ЁЖИ').context['page_obj']
+        self.assertEqual(len(page), 10)
+        for query in ('"кот', 'кот OR NOT', 'col:кот', '*'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(q=query).status_code, 200)
+        self.assertIsNone(self.search(q='').context['page_obj'])
+        response = self.search(q='кот', author='nobody')
+        self.assertIn('author', response.context['form'].errors)
+
+    def test_candidates_window_with_filters(self):
+        """
+        Проверим, что окно последних совпадений считается
+        с учётом фильтров: свежие посты других авторов и групп
+        не вытесняют из него подходящие.
+        """
+        Post.objects.bulk_create([
+            Post(text=f'Кот без группы №{i}', author=SearchTest.other)
+            for i in range(3)
+        ])
+        with self.settings(POSTS_SEARCH_CANDIDATES=3):
+            page = self.search(q='кот', group='cats').context['page_obj']
+            self.assertEqual(list(page), [SearchTest.best])
+            page = self.search(q='кот', author='writer').context['page_obj']
+            self.assertEqual(len(page), 3)
+            page = self.search(q='кот').context['page_obj']
+            self.assertEqual(len(page), 3)
+            self.assertNotIn(SearchTest.best, page)
+
+    def test_index_follows_writes(self):
+        """
+        Проверим, что правка и удаление поста сразу видны в индексе,
+        а команда перестраивает индекс и возвращает триггеры.
+        """
+        post = Post.objects.create(text='Уникальный енот', author=self.other)
+        self.assertEqual(list(matching(Post.objects.all(), 'енот')), [post])
+        post.text = 'Уникальный барсук'
+        post.save()
+        self.assertFalse(matching(Post.objects.all(), 'енот').exists())
+        self.assertTrue(matching(Post.objects.all(), 'барсук').exists())
+        with connection.cursor() as cursor:
+            drop_triggers(cursor)
+        Post.objects.filter(pk=post.pk).update(text='Уникальный бобр')
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn(str(Post.objects.count()), out.getvalue())
+        self.assertTrue(matching(Post.objects.all(), 'бобр').exists())
+        post.delete()
+        self.assertFalse(matching(Post.objects.all(), 'бобр').exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], Post.objects.count())
+
+    def test_admin_search(self):
+        """Проверим, что поиск в админке идёт по индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -0,0 +1,117 @@
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.models import Group, Post
+
+User = get_user_model()
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class SyndicationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Романы', slug='novels', description='Большие книги'
+        )
+        for i in range(3):
+            Post.objects.create(
+                text=f'Глава {i}', author=cls.author, group=cls.group
+            )
+        Post.objects.create(text='Заметка', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+
+    def rss_items(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/rss+xml'
+        ))
+        return ElementTree.fromstring(response.content).findall(
+            'channel/item'
+        )
+
+    def test_feeds(self):
+        """
+        Проверим ленты сайта, группы и автора в RSS и Atom:
+        ссылки абсолютные, посты от новых к старым.
+        """
+        items = self.rss_items(reverse('posts:index_rss'))
+        self.assertEqual(
+            [item.findtext('title') for item in items],
+            ['Заметка', 'Глава 2', 'Глава 1', 'Глава 0']
+        )
+        self.assertTrue(items[0].findtext('link').startswith(
+            'http://testserver/posts/'
+        ))
+        items = self.rss_items(
+            reverse('posts:group_rss', args=['novels'])
+        )
+        self.assertEqual(len(items), 3)
+        self.assertEqual(items[0].findtext('category'), 'Романы')
+        response = self.client.get(
+            reverse('posts:profile_atom', args=['writer'])
+        )
+        feed = ElementTree.fromstring(response.content)
+        self.assertEqual(feed.findtext(f'{ATOM}title'), 'Yatube: Лев Толстой')
+        self.assertEqual(len(feed.findall(f'{ATOM}entry')), 3)
+        for url in (reverse('posts:group_rss', args=['missing']),
+                    reverse('posts:profile_atom', args=['missing'])):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cache_and_conditional_get(self):
+        """
+        Проверим, что готовая лента берётся из кэша без запросов,
+        повторный опрос с ETag получает 304, а новый пост
+        сразу попадает в ленту.
+        """
+        url = reverse('posts:group_rss', args=['novels'])
+        response = self.client.get(url)
+        etag = response['ETag']
+        local_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached.content, response.content)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        Post.objects.create(
+            text='Эпилог', author=SyndicationTest.author,
+            group=SyndicationTest.group
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Эпилог', response.content.decode())
+        SyndicationTest.group.title = 'Повести'
+        SyndicationTest.group.save()
+        self.assertIn('Повести', self.client.get(url).content.decode())
+
+    def test_discovery_links(self):
+        """Проверим ссылки на ленты в заголовке страниц."""
+        for url, feed in (
+            (reverse('posts:index'), reverse('posts:index_rss')),
+            (reverse('posts:group_list', args=['novels']),
+             reverse('posts:group_atom', args=['novels'])),
+            (reverse('posts:profile', args=['writer']),
+             reverse('posts:profile_rss', args=['writer'])),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), f'href="{feed}"')
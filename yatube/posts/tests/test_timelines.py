@@ -0,0 +1,281 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.caching import local_cache
+from posts.models import Follow, Post, TimelineEntry, UserCounter
+from posts.timelines import RECENT_KEY, get_recent
+
+User = get_user_model()
+
+
+@override_settings(POSTS_FOLLOW_FEED='timeline')
+class TimelinesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        Post.objects.bulk_create([
+            Post(text=f'Тест №{i}', author=cls.author) for i in range(15)
+        ])
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+        self.client.force_login(TimelinesTest.user)
+
+    def get_timeline(self, user):
+        return set(TimelineEntry.objects.filter(
+            user=user
+        ).values_list('post_id', flat=True))
+
+    def test_timeline_follows_writes(self):
+        """
+        Проверим, что подписка добавляет в ленту посты автора,
+        новый пост раздаётся подписчикам, а отписка убирает
+        посты автора из ленты.
+        """
+        follow = Follow.objects.create(
+            user=TimelinesTest.user,
+            author=TimelinesTest.author
+        )
+        author_posts = set(
+            TimelinesTest.author.posts.values_list('pk', flat=True)
+        )
+        self.assertEqual(self.get_timeline(TimelinesTest.user), author_posts)
+        post = Post.objects.create(text='Новый', author=TimelinesTest.author)
+        self.assertIn(post.pk, self.get_timeline(TimelinesTest.user))
+        Post.objects.create(text='Ещё чужой', author=TimelinesTest.other)
+        self.assertEqual(
+            len(self.get_timeline(TimelinesTest.user)),
+            len(author_posts) + 1
+        )
+        follow.delete()
+        self.assertEqual(self.get_timeline(TimelinesTest.user), set())
+
+    def test_follow_feed_pages(self):
+        """
+        Проверим, что лента подписок листается курсором
+        по материализованной ленте без пропусков и повторов.
+        """
+        Follow.objects.create(
+            user=TimelinesTest.user,
+            author=TimelinesTest.author
+        )
+        url = reverse('posts:follow_index')
+        response = self.client.get(url)
+        first = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].next_cursor
+        second = list(
+            self.client.get(url, {'cursor': next_cursor}).context['page_obj']
+        )
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 5)
+        self.assertEqual(
+            first + second,
+            list(TimelinesTest.author.posts.all())
+        )
+        numbered = self.client.get(url, {'page': 2}).context['page_obj']
+        self.assertEqual(list(numbered), second)
+
+    def test_rebuild_command(self):
+        """Проверим, что команда восстанавливает ленты по подпискам."""
+        Follow.objects.create(
+            user=TimelinesTest.user,
+            author=TimelinesTest.author
+        )
+        expected = self.get_timeline(TimelinesTest.user)
+        TimelineEntry.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_timelines', stdout=out)
+        self.assertEqual(self.get_timeline(TimelinesTest.user), expected)
+        self.assertIn(str(len(expected)), out.getvalue())
+
+
+@override_settings(POSTS_AUTHOR_RECENT_SIZE=4, POSTS_FANOUT_MAX_FOLLOWERS=1)
+class MergedFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='writer')
+        for i in range(12):
+            Post.objects.create(text=f'Звезда №{i}', author=cls.star)
+            Post.objects.create(text=f'Автор №{i}', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.client = Client()
+        self.client.force_login(MergedFeedTest.user)
+
+    def follow_all(self):
+        for author in (MergedFeedTest.star, MergedFeedTest.author):
+            Follow.objects.create(user=MergedFeedTest.user, author=author)
+
+    def walk(self, url):
+        """Листает ленту вперёд до конца и обратно до начала."""
+        response = self.client.get(url)
+        pages = [list(response.context['page_obj'])]
+        while response.context['page_obj'].next_cursor:
+            response = self.client.get(
+                url, {'cursor': response.context['page_obj'].next_cursor}
+            )
+            pages.append(list(response.context['page_obj']))
+        back = [pages[-1]]
+        while response.context['page_obj'].previous_cursor:
+            response = self.client.get(
+                url, {'cursor': response.context['page_obj'].previous_cursor}
+            )
+            back.append(list(response.context['page_obj']))
+        self.assertEqual(back[::-1], pages)
+        return [post for page in pages for post in page]
+
+    def test_merge_matches_join(self):
+        """
+        Проверим, что лента, собранная слиянием при чтении, совпадает
+        с JOIN подписок и постов, в том числе за пределами
+        кэшированных списков последних постов.
+        """
+        url = reverse('posts:follow_index')
+        expected = list(Post.objects.filter(
+            author__in=[MergedFeedTest.star, MergedFeedTest.author]
+        ))
+        with self.settings(POSTS_FOLLOW_FEED='merge'):
+            self.follow_all()
+            self.assertFalse(TimelineEntry.objects.exists())
+            self.assertEqual(self.walk(url), expected)
+            post = Post.objects.create(
+                text='Свежий пост', author=MergedFeedTest.star
+            )
+            self.assertEqual(
+                self.client.get(url).context['page_obj'][0], post
+            )
+
+    def test_hybrid_skips_fan_out_for_popular(self):
+        """
+        Проверим, что в режиме hybrid посты популярного автора
+        не раздаются, а подмешиваются в ленту при чтении.
+        """
+        UserCounter.objects.filter(user=MergedFeedTest.star).update(
+            followers_count=2
+        )
+        url = reverse('posts:follow_index')
+        with self.settings(POSTS_FOLLOW_FEED='hybrid'):
+            self.follow_all()
+            Post.objects.create(text='Звезда', author=MergedFeedTest.star)
+            Post.objects.create(text='Автор', author=MergedFeedTest.author)
+            timeline_authors = set(TimelineEntry.objects.values_list(
+                'author', flat=True
+            ))
+            self.assertEqual(timeline_authors, {MergedFeedTest.author.pk})
+            self.assertEqual(self.walk(url), list(Post.objects.filter(
+                author__in=[MergedFeedTest.star, MergedFeedTest.author]
+            )))
+
+    def test_hybrid_author_drops_below_threshold(self):
+        """
+        Проверим, что посты, написанные автором выше порога раздачи,
+        остаются в лентах подписчиков, когда он опускается до порога.
+        """
+        fan = User.objects.create_user(username='fan')
+        url = reverse('posts:follow_index')
+        with self.settings(POSTS_FOLLOW_FEED='hybrid'):
+            Follow.objects.create(user=fan, author=MergedFeedTest.star)
+            self.follow_all()
+            post = Post.objects.create(
+                text='Звезда выше порога', author=MergedFeedTest.star
+            )
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            self.assertEqual(self.client.get(url).context['page_obj'][0],
+                             post)
+            Follow.objects.filter(user=fan).delete()
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=MergedFeedTest.user, post=post
+            ).exists())
+            self.assertEqual(self.client.get(url).context['page_obj'][0],
+                             post)
+            self.assertEqual(self.walk(url), list(Post.objects.filter(
+                author__in=[MergedFeedTest.star, MergedFeedTest.author]
+            )))
+
+    @override_settings(POSTS_TIMELINE_BACKFILL_SIZE=3)
+    def test_backfill_window(self):
+        """
+        Проверим, что подписка копирует в ленту только последние
+        посты автора, а лента и API глубже этой границы
+        читают остальные посты без пропусков.
+        """
+        url = reverse('posts:follow_index')
+        expected = list(Post.objects.filter(
+            author__in=[MergedFeedTest.star, MergedFeedTest.author]
+        ))
+        for strategy in ('timeline', 'hybrid'):
+            with self.subTest(strategy=strategy), \
+                    self.settings(POSTS_FOLLOW_FEED=strategy):
+                Follow.objects.all().delete()
+                cache.clear()
+                self.follow_all()
+                self.assertEqual(TimelineEntry.objects.count(), 6)
+                self.assertEqual(self.walk(url), expected)
+                rows = []
+                params = {}
+                while True:
+                    data = self.client.get(
+                        reverse('posts:api_follow'), params
+                    ).json()
+                    rows.extend(row['id'] for row in data['results'])
+                    if data['next'] is None:
+                        break
+                    params = {'cursor': data['next']}
+                self.assertEqual(rows, [post.pk for post in expected])
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertFalse(
+            Follow.objects.exclude(backfill_horizon=None).exists()
+        )
+
+    def test_bench_command(self):
+        """
+        Проверим, что сравнение стратегий выполняется во временной
+        базе и не трогает ни рабочую базу, ни общий кэш.
+        """
+        posts_count = Post.objects.count()
+        cache.set('bench-canary', 1)
+        out = StringIO()
+        call_command(
+            'bench_follow_feed', authors=5, posts=3, pages=2, repeat=1,
+            stdout=out
+        )
+        for name in ('join', 'timeline', 'merge', 'hybrid'):
+            self.assertIn(name, out.getvalue())
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertEqual(cache.get('bench-canary'), 1)
+
+
+@override_settings(POSTS_FOLLOW_FEED='merge')
+class RecentOnCommitTest(TransactionTestCase):
+    def test_recent_list(self):
+        """
+        Проверим, что список последних постов автора, собранный
+        до фиксации записи поста, после неё сбрасывается.
+        """
+        author = User.objects.create_user(username='writer')
+        with transaction.atomic():
+            post = Post.objects.create(text='Новый', author=author)
+            # Так его закэшировало бы чтение по старому снимку.
+            cache.set(RECENT_KEY.format(author.pk), [])
+        self.assertEqual(
+            get_recent([author.pk])[author.pk],
+            [(post.pub_date, post.pk)]
+        )
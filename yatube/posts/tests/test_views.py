@@ -7,7 +7,11 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from posts.models import Follow, Group, Post, Comment
+from posts.paginators import get_page_window
 
 User = get_user_model()
 
@@ -178,6 +182,65 @@ class PostPagesTests(TestCase):
                 )
                 self.assertEqual(obj_count, page_count)
 
+    def test_cursor_paginator(self):
+        """
+        Проверим keyset-пагинацию: переход вперёд и назад по курсору
+        без запроса COUNT.
+        """
+        cache.clear()
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url).context.get('page_obj')
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        with CaptureQueriesContext(connection) as queries:
+            second_page = self.guest_client.get(
+                url, {'cursor': first_page.next_cursor}
+            ).context.get('page_obj')
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries
+        ))
+        self.assertEqual(
+            second_page.object_list,
+            list(Post.objects.all()[10:20])
+        )
+        self.assertFalse(second_page.has_next())
+        back_page = self.guest_client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context.get('page_obj')
+        self.assertEqual(back_page.object_list, first_page.object_list)
+        broken_page = self.guest_client.get(
+            url, {'cursor': 'broken'}
+        ).context.get('page_obj')
+        self.assertEqual(broken_page.object_list, first_page.object_list)
+
+    def test_page_window(self):
+        """
+        Проверим, что нумерованный пагинатор выводит окно страниц,
+        а не весь page_range.
+        """
+        posts_list = [
+            Post(text=f'Окно №{i}', author=PostPagesTests.user)
+            for i in range(100)
+        ]
+        Post.objects.bulk_create(posts_list)
+        response = self.guest_client.get(
+            reverse('posts:index'), {'page': 6}
+        )
+        self.assertEqual(
+            response.context.get('page_obj').page_window,
+            [1, None, 4, 5, 6, 7, 8, None, 12]
+        )
+        self.assertNotContains(response, '?page=10"')
+        paginator = Paginator(range(120), 10)
+        for number, window in (
+            (5, [1, 2, 3, 4, 5, 6, 7, None, 12]),
+            (8, [1, None, 6, 7, 8, 9, 10, 11, 12]),
+        ):
+            with self.subTest(number=number):
+                self.assertEqual(
+                    get_page_window(paginator.page(number)), window
+                )
+
     def test_index_contex(self):
         """
         Проверяем, что передаём в view.index верный context.
@@ -362,3 +425,31 @@ class PostPagesTests(TestCase):
                 author=PostPagesTests.user_author
             ).exists()
         )
+
+    @override_settings(POSTS_FOLLOW_FEED='timeline')
+    def test_feed_queries_budget(self):
+        """
+        Проверим, что число запросов ленты не зависит от числа
+        постов на странице: автор и группа подтягиваются JOIN-ом.
+        """
+        cache.clear()
+        Follow.objects.create(
+            user=PostPagesTests.user,
+            author=PostPagesTests.user_author
+        )
+        pages_budget = {
+            reverse('posts:index'): 3,
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostPagesTests.group_1.slug}
+            ): 4,
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostPagesTests.user_author}
+            ): 5,
+            reverse('posts:follow_index'): 3,
+        }
+        for page, budget in pages_budget.items():
+            with self.subTest(page=page):
+                with self.assertNumQueries(budget):
+                    self.authorized_client.get(page)
@@ -0,0 +1,374 @@
+import heapq
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import now_and_on_commit, replica_lacks
+from .follow_graph import (get_backfill_horizons, get_followers_count,
+                           get_followers_counts, get_following_ids)
+from .models import (TIMELINE_KEYS, Follow, Post, TimelineEntry,
+                     UserCounter)
+from .paginators import (NEXT, CursorPaginator, get_page_obj,
+                         keyset_filter, keyset_ordering)
+
+BATCH_SIZE = 500
+RECENT_KEY = 'posts:author_recent:{}'
+
+TIMELINE = 'timeline'
+MERGE = 'merge'
+HYBRID = 'hybrid'
+
+
+def fans_out(author_id):
+    """Раздаются ли посты автора в ленты подписчиков при записи."""
+    strategy = settings.POSTS_FOLLOW_FEED
+    if strategy == TIMELINE:
+        return True
+    if strategy == MERGE:
+        return False
+    return (get_followers_count(author_id)
+            <= settings.POSTS_FANOUT_MAX_FOLLOWERS)
+
+
+def _insert(rows):
+    """
+    Вставляет строки (user_id, post_id, author_id, pub_date) пачками.
+    Уже существующие записи пропускаются, поэтому повторная раздача
+    того же поста безопасна.
+    """
+    rows = iter(rows)
+    inserted = 0
+    while True:
+        batch = [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for user_id, post_id, author_id, pub_date
+            in islice(rows, BATCH_SIZE)
+        ]
+        if not batch:
+            return inserted
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        inserted += len(batch)
+
+
+def fan_out(post):
+    """Раздаёт новый пост в ленты подписчиков автора."""
+    if not fans_out(post.author_id):
+        return 0
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator()
+    return _insert(
+        (user_id, post.pk, post.author_id, post.pub_date)
+        for user_id in followers
+    )
+
+
+def _backfill(follows, author_id):
+    """
+    Копирует последние POSTS_TIMELINE_BACKFILL_SIZE постов автора
+    в ленты подписчиков из follows; если постов больше, граница
+    запоминается в подписках. Возвращает id подписчиков.
+    """
+    size = settings.POSTS_TIMELINE_BACKFILL_SIZE
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date')[:size + 1])
+    if len(posts) > size:
+        # Граница - дата самого нового из нескопированных постов.
+        follows.update(backfill_horizon=posts[size][1])
+        posts = posts[:size]
+    user_ids = list(follows.values_list('user_id', flat=True))
+    _insert(
+        (user_id, post_id, author_id, pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+    return user_ids
+
+
+def backfill(user_id, author_id):
+    """
+    Добавляет в ленту user_id последние POSTS_TIMELINE_BACKFILL_SIZE
+    постов автора, на которого он подписался: подписка на автора
+    с тысячами постов не должна копировать их все в запросе.
+    Если постов больше, граница запоминается в подписке,
+    и глубже неё лента читается JOIN подписок и постов.
+    """
+    if not fans_out(author_id):
+        return []
+    return _backfill(
+        Follow.objects.filter(user_id=user_id, author_id=author_id),
+        author_id
+    )
+
+
+def backfill_followers(author_ids):
+    """
+    В режиме hybrid дополняет ленты подписчиков авторов, у которых
+    после отписки осталось ровно POSTS_FANOUT_MAX_FOLLOWERS
+    подписчиков: их посты, написанные выше порога, не раздавались,
+    а слияние при чтении перестаёт их подмешивать. Дополнение
+    такое же, как при подписке, глубже границы посты читаются
+    слиянием. Возвращает id подписчиков, чьи ленты изменились.
+    """
+    if settings.POSTS_FOLLOW_FEED != HYBRID:
+        return set()
+    crossed = UserCounter.objects.filter(
+        user_id__in=author_ids,
+        followers_count=settings.POSTS_FANOUT_MAX_FOLLOWERS
+    ).values_list('user_id', flat=True)
+    user_ids = set()
+    for author_id in crossed:
+        user_ids.update(_backfill(
+            Follow.objects.filter(author_id=author_id), author_id
+        ))
+    return user_ids
+
+
+def get_backfill_horizon(user_id):
+    """
+    Дата, начиная с которой и глубже лента user_id может быть
+    неполной, или None, если в ней все посты подписок.
+    """
+    return max(get_backfill_horizons(user_id).values(), default=None)
+
+
+def trim(user_id, author_ids):
+    """Убирает из ленты user_id посты авторов после отписки."""
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id,
+        author_id__in=author_ids
+    ).delete()
+    return deleted
+
+
+def rebuild(user_ids=None):
+    """
+    Собирает ленты заново по подпискам и постам.
+    Без user_ids перестраиваются ленты всех пользователей.
+    Возвращает число записей в собранных лентах.
+    """
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.filter(author__posts__isnull=False)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    entries.delete()
+    # Ленты собираются целиком, без границы дополнения. Границы,
+    # оставшиеся в кэше до его срока, лишь отправляют чтение в JOIN,
+    # который даёт ту же ленту.
+    Follow.objects.filter(
+        **({} if user_ids is None else {'user_id__in': user_ids})
+    ).exclude(backfill_horizon=None).update(backfill_horizon=None)
+    strategy = settings.POSTS_FOLLOW_FEED
+    if strategy == MERGE:
+        return 0
+    if strategy == HYBRID:
+        follows = follows.exclude(
+            author__counter__followers_count__gt=(
+                settings.POSTS_FANOUT_MAX_FOLLOWERS
+            )
+        )
+    return _insert(follows.values_list(
+        'user_id', 'author__posts__id', 'author_id',
+        'author__posts__pub_date'
+    ).iterator())
+
+
+def forget_recent(author_id):
+    """
+    Сбрасывает кэшированный список последних постов автора
+    (см. now_and_on_commit).
+    """
+    key = RECENT_KEY.format(author_id)
+    now_and_on_commit(partial(cache.delete, key), keys=[key])
+
+
+def _author_rows(author_id, direction, pub_date, pk, limit):
+    """(pub_date, id) постов автора после позиции, по индексу автора."""
+    descending = direction == NEXT
+    posts = Post.objects.filter(author_id=author_id)
+    if pub_date is not None:
+        posts = posts.filter(
+            keyset_filter(('pub_date', 'id'), pub_date, pk, descending)
+        )
+    return list(posts.order_by(
+        *keyset_ordering(('pub_date', 'id'), descending)
+    ).values_list('pub_date', 'id')[:limit])
+
+
+def get_recent(author_ids):
+    """
+    Последние посты авторов: {author_id: [(pub_date, id), ...]}
+    от новых к старым, не больше POSTS_AUTHOR_RECENT_SIZE на автора.
+    Списки читаются из кэша одним get_many, недостающие
+    собираются по индексу (author, pub_date) и сохраняются.
+    """
+    keys = {RECENT_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    recent = {
+        keys[key]: items for key, items in cache.get_many(keys).items()
+    }
+    missing = {}
+    for key, author_id in keys.items():
+        if author_id not in recent:
+            recent[author_id] = missing[key] = _author_rows(
+                author_id, NEXT, None, None,
+                settings.POSTS_AUTHOR_RECENT_SIZE
+            )
+    for key in replica_lacks(missing):
+        del missing[key]
+    if missing:
+        cache.set_many(missing, settings.POSTS_AUTHOR_RECENT_TIMEOUT)
+    return recent
+
+
+def _author_items(author_id, recent, direction, position, limit):
+    """
+    До limit постов автора после позиции: из списка последних,
+    а если позиция уходит глубже списка, из базы.
+    """
+    if direction == NEXT:
+        items = [item for item in recent
+                 if position is None or item < position]
+        # Список не полон, значит в нём все посты автора.
+        complete = (len(recent) < settings.POSTS_AUTHOR_RECENT_SIZE
+                    or len(items) >= limit)
+    else:
+        items = [item for item in reversed(recent) if item > position]
+        complete = (len(recent) < settings.POSTS_AUTHOR_RECENT_SIZE
+                    or position >= recent[-1])
+    if complete:
+        return items[:limit]
+    pub_date, pk = position or (None, None)
+    return _author_rows(author_id, direction, pub_date, pk, limit)
+
+
+def _timeline_rows(user, direction, pub_date, pk, limit):
+    descending = direction == NEXT
+    entries = TimelineEntry.objects.filter(user=user)
+    if pub_date is not None:
+        entries = entries.filter(
+            keyset_filter(('pub_date', 'post_id'), pub_date, pk, descending)
+        )
+    return list(entries.order_by(
+        *keyset_ordering(('pub_date', 'post_id'), descending)
+    ).values_list('pub_date', 'post_id')[:limit])
+
+
+def merge_feed(user, direction, pub_date, pk, limit):
+    """
+    id постов ленты подписок user после позиции, собранные
+    k-путевым слиянием (heapq.merge) списков последних постов авторов.
+    В режиме hybrid сливаются только авторы, чьи посты не раздаются,
+    и материализованная лента пользователя.
+    """
+    authors = get_following_ids(user.pk)
+    hybrid = settings.POSTS_FOLLOW_FEED == HYBRID
+    if hybrid:
+        # Авторы, чьи посты попали в ленту не все, тоже сливаются.
+        partial_authors = get_backfill_horizons(user.pk)
+        authors = [
+            author_id
+            for author_id, count in get_followers_counts(authors).items()
+            if count > settings.POSTS_FANOUT_MAX_FOLLOWERS
+            or author_id in partial_authors
+        ]
+    position = None if pub_date is None else (pub_date, pk)
+    sources = [
+        _author_items(author_id, items, direction, position, limit)
+        for author_id, items in get_recent(authors).items()
+    ]
+    if hybrid:
+        sources.append(_timeline_rows(user, direction, pub_date, pk, limit))
+    ids = []
+    for _, post_id in heapq.merge(*sources, reverse=direction == NEXT):
+        # Пост автора, перешедшего порог, мог остаться
+        # и в материализованной ленте.
+        if post_id not in ids:
+            ids.append(post_id)
+        if len(ids) == limit:
+            break
+    return ids
+
+
+class MergedFeedPaginator(CursorPaginator):
+    """
+    Лента подписок, собранная слиянием при чтении: из базы
+    читаются только посты показываемой страницы.
+    object_list (JOIN подписок и постов) используется лишь
+    нумерованными страницами ?page=N.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 user=None):
+        super().__init__(object_list, per_page, keys)
+        self.user = user
+
+    def fetch(self, direction, pub_date, pk, limit):
+        ids = merge_feed(self.user, direction, pub_date, pk, limit)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Лента подписок из материализованной ленты timeline. Страница,
+    которая заходит за границу дополнения ленты (см. backfill),
+    читается из object_list - JOIN подписок и постов; им же
+    пользуются нумерованные страницы ?page=N.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 user=None, timeline=None):
+        super().__init__(object_list, per_page, keys)
+        self.user = user
+        self.timeline = timeline
+
+    def timeline_paginator(self):
+        return CursorPaginator(self.timeline, self.per_page, TIMELINE_KEYS)
+
+    def fetch(self, direction, pub_date, pk, limit):
+        horizon = get_backfill_horizon(self.user.pk)
+        if horizon is None or pub_date is None or pub_date > horizon:
+            rows = self.timeline_paginator().fetch(
+                direction, pub_date, pk, limit
+            )
+            # Выше границы лента полна; ниже - только если страница
+            # кончилась раньше неё.
+            complete = horizon is None or (
+                (direction != NEXT or len(rows) == limit)
+                and all(
+                    self.parse_cursor_key(self.cursor_key(row)) > horizon
+                    for row in rows
+                )
+            )
+            if complete:
+                return rows
+        return super().fetch(direction, pub_date, pk, limit)
+
+
+def get_follow_page(request, user):
+    """Страница ленты подписок по стратегии POSTS_FOLLOW_FEED."""
+    posts = Post.objects.for_feed().by_authors(
+        user.follower.values('author')
+    )
+    if settings.POSTS_FOLLOW_FEED == TIMELINE:
+        return get_page_obj(
+            request, posts,
+            paginator_class=partial(
+                TimelinePaginator, user=user,
+                timeline=Post.objects.for_feed().timeline(user)
+            )
+        )
+    return get_page_obj(
+        request, posts,
+        paginator_class=partial(MergedFeedPaginator, user=user)
+    )
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import syndication, views
 
 app_name = 'posts'
 
@@ -13,8 +13,28 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comments,
+        name='comments'
+    ),
+    path(
+        'posts/<int:post_id>/comments/<int:comment_id>/replies/',
+        views.comment_replies,
+        name='comment_replies'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('group/<slug:slug>/', views.group_list, name='group_list'),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
+    path(
+        'group/<slug:slug>/export/',
+        views.group_export,
+        name='group_export'
+    ),
     path('', views.index, name='index'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
@@ -27,4 +47,39 @@ urlpatterns = [
         views.profile_unfollow,
         name="profile_unfollow"
     ),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
+    path('search/', views.search, name='search'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('rss/', syndication.index_rss, name='index_rss'),
+    path('atom/', syndication.index_atom, name='index_atom'),
+    path('group/<slug:slug>/rss/', syndication.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', syndication.group_atom, name='group_atom'),
+    path(
+        'profile/<str:username>/rss/',
+        syndication.profile_rss,
+        name='profile_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        syndication.profile_atom,
+        name='profile_atom'
+    ),
+    path('api/v1/posts/', views.api_index, name='api_index'),
+    path('api/v1/posts/<int:post_id>/', views.api_post, name='api_post'),
+    path(
+        'api/v1/posts/<int:post_id>/comments/',
+        views.api_comments,
+        name='api_comments'
+    ),
+    path(
+        'api/v1/groups/<slug:slug>/posts/',
+        views.api_group,
+        name='api_group'
+    ),
+    path(
+        'api/v1/profiles/<str:username>/posts/',
+        views.api_profile,
+        name='api_profile'
+    ),
+    path('api/v1/follow/posts/', views.api_follow, name='api_follow'),
 ]
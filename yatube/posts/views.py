@@ -1,78 +1,129 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
-from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post, User
+from . import api
+from .caching import feed_cache_context, get_cache_stats
+from .conditional import (anonymous_condition, comments_scopes,
+                          group_scopes, index_scopes, post_scopes,
+                          profile_scopes, public_condition)
+from .comments import get_comments_page, get_replies
+from .counters import get_user_counter
+from .exports import CONTENT_TYPES, export_response
+from .follow_graph import is_following
+from .follows import follow, resolve_authors, unfollow
+from .forms import CommentForm, FollowBulkForm, PostForm, SearchForm
+from .models import Group, Post, User
+from .paginators import get_page_obj
+from .search import get_search_page
+from .timelines import get_follow_page
 
 
+@anonymous_condition(index_scopes)
 def index(request):
     title = 'Последние обновления на сайте.'
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'index': True,
         'title': title,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **feed_cache_context(request, 'index')
     }
     return render(request, template, context)
 
 
+@anonymous_condition(group_scopes)
 def group_list(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **feed_cache_context(request, 'group_list', group.pk)
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@anonymous_condition(post_scopes)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counter', 'group'),
+        id=post_id
+    )
     post_title = post.text[:30]
-    author_posts_count = post.author.posts.count()
+    author_posts_count = get_user_counter(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_comments_page(request, post.pk)
+    reply_to = request.GET.get('reply_to', '')
     context = {
         'post': post,
         'post_title': post_title,
         'author_posts_count': author_posts_count,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'reply_to': reply_to if reply_to.isdigit() else ''
     }
     return render(request, template, context)
 
 
+@anonymous_condition(comments_scopes)
+def comments(request, post_id):
+    """Следующая страница комментариев поста для «Показать ещё»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(request, post_id),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@anonymous_condition(comments_scopes)
+def comment_replies(request, post_id, comment_id):
+    """Следующие ответы ветки для «Показать ещё ответы»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        'post_id': post_id,
+        'comments': get_replies(
+            post_id, comment_id, request.GET.get('cursor', '')
+        ),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@anonymous_condition(profile_scopes)
 def profile(request, username):
     template = 'posts/profile.html'
     user = request.user
-    author = get_object_or_404(User, username=username)
-    author_posts_list = author.posts.all()
-    author_posts_list_count = author_posts_list.count()
-    paginator = Paginator(author_posts_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = user.is_authenticated and user.follower.filter(
-        author=author
-    ).exists()
+    author = get_object_or_404(
+        User.objects.select_related('counter'),
+        username=username
+    )
+    counter = get_user_counter(author)
+    author_posts_list = author.posts.for_feed()
+    page_obj = get_page_obj(request, author_posts_list)
+    following = user.is_authenticated and is_following(user.pk, author.pk)
     context = {
         'following': following,
         'author': author,
-        'author_posts_list_count': author_posts_list_count,
-        'page_obj': page_obj
+        'author_posts_list_count': counter.posts_count,
+        'counter': counter,
+        'page_obj': page_obj,
+        **feed_cache_context(request, 'profile', author.pk)
     }
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
     user = request.user
@@ -112,15 +163,26 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(
         request.POST or None
     )
+    parent = None
+    parent_id = request.POST.get('parent', '')
+    if parent_id:
+        # Отвечать можно только на комментарии того же поста.
+        parent = post.comments.filter(
+            pk=parent_id if parent_id.isdigit() else None
+        ).first()
+        if parent is None:
+            return redirect('posts:post_detail', post_id=post.id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = parent
         comment.save()
     return redirect('posts:post_detail', post_id=post.id)
 
@@ -130,35 +192,144 @@ def follow_index(request):
     user = request.user
     title = 'Статьи авторов, на которых Вы подписаны.'
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_follow_page(request, user)
     context = {
         'follow': True,
         'title': title,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        **feed_cache_context(request, 'follow_index', user.pk)
     }
     return render(request, template, context)
 
 
 @login_required
 def profile_follow(request, username):
-    user = request.user
-    author = get_object_or_404(User, username=username)
-    # без этого условия у меня не получается пройти автоматические тесты(
-    if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
-        return redirect('posts:profile', username=author)
-    return redirect('posts:profile', username=author)
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username
+    )
+    follow(request.user.pk, [author_id])
+    return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    user = request.user
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username
+    )
+    unfollow(request.user.pk, [author_id])
+    return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """
+    Подписка или отписка списком имён, например при импорте
+    подписок из другого сервиса. Отвечает JSON с итогами.
+    """
+    form = FollowBulkForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    usernames = form.cleaned_data['usernames']
+    authors = resolve_authors(usernames)
+    action = (
+        follow if form.cleaned_data['action'] == FollowBulkForm.FOLLOW
+        else unfollow
+    )
+    changed = action(request.user.pk, authors.values())
+    return JsonResponse({
+        'changed': len(changed),
+        'missing': [name for name in usernames if name not in authors],
+    })
+
+
+def search(request):
+    template = 'posts/search.html'
+    form = SearchForm(request.GET)
+    page_obj = None
+    if form.is_valid():
+        page_obj = get_search_page(request, **form.cleaned_data)
+    # Ссылки пагинатора должны сохранять запрос и фильтры.
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query_prefix': f'{params.urlencode()}&' if params else '',
+    }
+    return render(request, template, context)
+
+
+def export_format(request):
+    fmt = request.GET.get('format', 'jsonl')
+    return fmt if fmt in CONTENT_TYPES else None
+
+
+@login_required
+def profile_export(request, username):
+    """Все посты автора одним потоковым файлом: jsonl, csv или zip."""
+    fmt = export_format(request)
+    if fmt is None:
+        return HttpResponseBadRequest('Неизвестный формат выгрузки.')
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(
-        user=user,
-        author=author
-    ).delete()
-    return redirect('posts:profile', username=author)
+    return export_response(author.posts.all(), author.username, fmt)
+
+
+@login_required
+def group_export(request, slug):
+    """Все посты группы одним потоковым файлом: jsonl, csv или zip."""
+    fmt = export_format(request)
+    if fmt is None:
+        return HttpResponseBadRequest('Неизвестный формат выгрузки.')
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(group.posts.all(), group.slug, fmt)
+
+
+@staff_member_required
+def cache_stats(request):
+    """Попадания и промахи кэша обслужившего запрос процесса."""
+    return JsonResponse(get_cache_stats())
+
+
+@public_condition(index_scopes)
+def api_index(request):
+    return api.posts_response(request, Post.objects.all())
+
+
+@public_condition(group_scopes)
+def api_group(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return api.not_found()
+    return api.posts_response(request, Post.objects.filter(group_id=group_id))
+
+
+@public_condition(profile_scopes)
+def api_profile(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return api.not_found()
+    return api.posts_response(
+        request, Post.objects.filter(author_id=author_id)
+    )
+
+
+@api.login_required_json
+def api_follow(request):
+    return api.content_condition(
+        request, api.follow_response(request, request.user)
+    )
+
+
+@public_condition(post_scopes)
+def api_post(request, post_id):
+    return api.post_response(request, post_id)
+
+
+@public_condition(comments_scopes)
+def api_comments(request, post_id):
+    return api.comments_response(request, post_id)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -54,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,7 +90,42 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, PRAGMA ниже
+        # выполняются один раз на соединение.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+    }
+}
+
+# Реплика для чтения лент и страниц постов. Локально её роль играет
+# второй файл SQLite, который обновляет команда sync_replica.
+DATABASE_REPLICA = os.getenv('DATABASE_REPLICA')
+if DATABASE_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DATABASE_REPLICA,
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Приложения, модели которых читаются с реплики.
+REPLICA_READ_APPS = ('posts', 'auth')
+
+# Сколько секунд после записи пользователь читает из основной базы.
+# Должно с запасом превышать отставание реплики.
+REPLICA_STICKY_SECONDS = 10
+
+# PRAGMA для каждого нового соединения с SQLite (core.db).
+# WAL: чтение не блокируется записью; synchronous=NORMAL в режиме WAL
+# не теряет целостность, лишь последние транзакции при сбое питания;
+# busy_timeout: писатели ждут блокировку, а не падают с ошибкой.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
 }
 
 
@@ -145,8 +183,94 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш общий для всех воркеров задаётся переменными окружения:
+# CACHE_BACKEND=sqlite - файл SQLite на машине (CACHE_LOCATION - путь),
+# CACHE_BACKEND=memcached или redis - внешний сервер
+# (CACHE_LOCATION - адрес, для redis нужен пакет django-redis).
+# locmem у каждого процесса свой и годится только для runserver.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache.SQLiteCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+
+if CACHE_BACKEND == 'sqlite' and not CACHE_LOCATION:
+    CACHE_LOCATION = os.path.join(BASE_DIR, 'cache.sqlite3')
+
+if CACHE_BACKEND in ('memcached', 'redis') and not CACHE_LOCATION:
+    raise ImproperlyConfigured(
+        f'CACHE_BACKEND={CACHE_BACKEND} требует адрес сервера '
+        f'в CACHE_LOCATION.'
+    )
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': CACHE_LOCATION,
     }
 }
+
+# MAX_ENTRIES понимают только бэкенды на базе BaseCache: OPTIONS
+# memcached и redis уходят клиенту как аргументы конструктора.
+if CACHE_BACKEND in ('locmem', 'sqlite'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+POSTS_FEED_CACHE_TIMEOUT = 60 * 15
+
+POSTS_CACHE_STALE_TIMEOUT = 60 * 5
+
+POSTS_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Отметки изменения областей для ETag и автор поста по id.
+# Потерянная отметка заменяется текущим моментом, так что срок
+# лишь ограничивает число ключей в общем кэше.
+POSTS_SCOPE_STAMP_TIMEOUT = 60 * 60 * 24 * 7
+
+POSTS_LOCAL_CACHE_SIZE = 1000
+
+POSTS_LOCAL_CACHE_TIMEOUT = 60
+
+# Как строится лента подписок:
+# timeline - из материализованных лент (раздача при записи),
+# merge - слиянием списков последних постов авторов при чтении,
+# hybrid - посты авторов, у которых больше POSTS_FANOUT_MAX_FOLLOWERS
+# подписчиков, не раздаются, а подмешиваются при чтении.
+POSTS_FOLLOW_FEED = os.getenv('POSTS_FOLLOW_FEED', 'timeline')
+
+POSTS_FANOUT_MAX_FOLLOWERS = 1000
+
+# Сколько последних постов автора копируется в ленту при подписке.
+# Более старые посты лента читает JOIN подписок и постов.
+POSTS_TIMELINE_BACKFILL_SIZE = 50
+
+POSTS_AUTHOR_RECENT_SIZE = 20
+
+POSTS_AUTHOR_RECENT_TIMEOUT = 60 * 60
+
+POSTS_FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+
+# Сколько последних совпадений ранжирует поиск по постам.
+POSTS_SEARCH_CANDIDATES = 10000
+
+# Выгрузка постов: строк в одной порции iterator() и размер
+# отдаваемого клиенту блока.
+POSTS_EXPORT_CHUNK_SIZE = 2000
+
+POSTS_EXPORT_BUFFER_SIZE = 64 * 1024
+
+# RSS и Atom: число постов в ленте и срок хранения готовой ленты.
+POSTS_SYNDICATION_ITEMS = 20
+
+POSTS_SYNDICATION_CACHE_TIMEOUT = 60 * 15
+
+# Наибольшая вложенность ответов на комментарии (0 - без ответов).
+POSTS_COMMENT_MAX_DEPTH = 4
+
+# Сколько ответов ветки выводится сразу; остальные подгружаются
+# ссылкой «Показать ещё ответы».
+POSTS_COMMENT_REPLIES_PER_THREAD = 50